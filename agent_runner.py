@@ -49,24 +49,29 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
-# Ensure database tables exist and seed data
-from app.database import engine
-from app.models import Base
-Base.metadata.create_all(bind=engine)
 
-from app.database import SessionLocal
-from app.init_db import seed_erp_data
+def _bootstrap():
+    """Ensure database tables exist and seed data (run only when started directly)."""
+    from app.database import engine, SessionLocal
+    from app.models import create_missing_tables, ensure_indexes
+    from app.init_db import seed_erp_data
+
+    create_missing_tables(engine)
+    ensure_indexes(engine)
+    try:
+        db = SessionLocal()
+        seed_erp_data(db)
+        db.commit()
+        db.close()
+        logging.getLogger("AgentRunner").info("Database initialized and seeded.")
+    except Exception as e:
+        logging.getLogger("AgentRunner").warning(f"Seed warning: {e}")
 
-try:
-    db = SessionLocal()
-    seed_erp_data(db)
-    db.close()
-    logging.getLogger("AgentRunner").info("Database initialized and seeded.")
-except Exception as e:
-    logging.getLogger("AgentRunner").warning(f"Seed warning: {e}")
 
 # Start the autonomous agent loop
 if __name__ == "__main__":
+    _bootstrap()
+
     print()
     print("╔══════════════════════════════════════════════════════════╗")
     print("║       PROCURE-IQ AUTONOMOUS AGENT (Standalone)         ║")
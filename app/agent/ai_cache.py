@@ -0,0 +1,117 @@
+"""
+AI Response Cache Backends
+
+Stores completed AIResponse payloads (as plain dicts) so identical
+deterministic prompts skip the provider round-trip.
+
+Backend is chosen with AI_CACHE_BACKEND:
+  memory  — in-process TTL cache (default, lost on restart)
+  sqlite  — local file (AI_CACHE_PATH), shared by every process on the host
+  redis   — REDIS_URL, shared across hosts
+  none    — caching disabled
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import orjson
+from cachetools import TTLCache
+
+logger = logging.getLogger("AICache")
+
+
+class MemoryCache:
+    """In-process LRU + TTL cache."""
+
+    def __init__(self, maxsize: int, ttl: int):
+        self._data = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            return self._data.get(key)
+
+    def set(self, key: str, value: dict):
+        with self._lock:
+            self._data[key] = value
+
+
+class SQLiteCache:
+    """File-backed cache — survives restarts and is shared between local workers."""
+
+    SWEEP_EVERY = 500  # writes between expired-row sweeps
+
+    def __init__(self, path: str, ttl: int):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ai_cache (key TEXT PRIMARY KEY, resp TEXT NOT NULL, ts INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT resp FROM ai_cache WHERE key = ? AND ts > ?",
+                (key, int(time.time()) - self.ttl),
+            ).fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    def set(self, key: str, value: dict):
+        now = int(time.time())
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ai_cache (key, resp, ts) VALUES (?, ?, ?)",
+                (key, orjson.dumps(value).decode(), now),
+            )
+            self._writes += 1
+            if self._writes % self.SWEEP_EVERY == 0:
+                self._conn.execute("DELETE FROM ai_cache WHERE ts <= ?", (now - self.ttl,))
+            self._conn.commit()
+
+
+class RedisCache:
+    """Redis-backed cache — shared across hosts; expiry handled by Redis."""
+
+    PREFIX = "procureiq:ai:"
+
+    def __init__(self, url: str, ttl: int):
+        import redis
+        self.ttl = ttl
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[dict]:
+        raw = self._redis.get(self.PREFIX + key)
+        return orjson.loads(raw) if raw else None
+
+    def set(self, key: str, value: dict):
+        self._redis.setex(self.PREFIX + key, self.ttl, orjson.dumps(value))
+
+
+def build_response_cache():
+    """Create the cache backend selected by AI_CACHE_BACKEND (None = disabled)."""
+    backend = os.environ.get("AI_CACHE_BACKEND", "memory").lower()
+    ttl = int(os.environ.get("AI_CACHE_TTL", 3600))
+
+    if backend == "none":
+        return None
+    try:
+        if backend == "sqlite":
+            path = os.environ.get("AI_CACHE_PATH", "./ai_cache.db")
+            logger.info(f"AI response cache: SQLite ({path})")
+            return SQLiteCache(path, ttl)
+        if backend == "redis":
+            url = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+            logger.info("AI response cache: Redis")
+            return RedisCache(url, ttl)
+    except Exception as e:
+        logger.warning(f"AI cache backend '{backend}' unavailable ({e}) — using memory")
+
+    return MemoryCache(int(os.environ.get("AI_CACHE_SIZE", 10_000)), ttl)
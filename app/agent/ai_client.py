@@ -1,24 +1,187 @@
 import asyncio
+import concurrent.futures
+import dataclasses
+import functools
+import hashlib
 import time
 import logging
-import json
 import os
+import random
 import re
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncIterator, Callable
 from dataclasses import dataclass
 from enum import Enum
 
-# External SDKs — use new google.genai SDK
-try:
-    import google.genai as genai
-    _GENAI_NEW = True
-except ImportError:
-    import google.generativeai as genai  # legacy fallback
-    _GENAI_NEW = False
-from openai import AsyncOpenAI
+# Provider SDKs (google.genai / google.generativeai / openai) are imported
+# lazily in AIClient.__init__ — only for backends that have a key configured.
+import httpx
+import orjson
+from cachetools import LRUCache
+
+from .ai_cache import build_response_cache
 
 logger = logging.getLogger("AIClient")
 
+# Output-token caps per kind of call — pass `profile=` to complete()
+MAX_TOKEN_PROFILES = {
+    "classify": 128,
+    "extract": 512,
+    "reason": 1000,
+    "health": 8,
+}
+
+# Context window assumed for complete_with_memory history trimming
+MAX_CONTEXT_TOKENS = int(os.environ.get("AI_MAX_CONTEXT_TOKENS", 128_000))
+CONTEXT_RESERVE_TOKENS = 512  # headroom for role/formatting overhead
+
+# Rule-based fallback extractors
+_RE_VENDOR = re.compile(r'FROM:\s*(.+)', re.IGNORECASE)
+_RE_AMOUNTS = (
+    re.compile(r'\$\s*([\d,]+\.\d{2})', re.IGNORECASE),
+    re.compile(r'(?:amount|total)[:\s]+\$?\s*([\d,]+\.?\d*)', re.IGNORECASE),
+)
+_RE_INVOICE_NO = re.compile(r'(?:invoice|inv)\s*#?\s*:?\s*([A-Z0-9\-]{3,20})', re.IGNORECASE)
+
+# Approximate provider pricing, USD per 1k tokens
+MODEL_COSTS = {
+    "gemini-1.5-pro": {"input": 0.00035, "output": 0.00105},
+    "gpt-4o": {"input": 0.005, "output": 0.015},
+}
+
+
+def _build_http_client() -> httpx.AsyncClient:
+    """
+    Shared HTTP/2 connection pool for every OpenAI-compatible provider.
+
+    Keeping sockets warm avoids a fresh TLS handshake per completion, and
+    HTTP/2 lets concurrent requests multiplex over a single connection.
+    Pooled connections belong to the event loop that opened them, so all
+    AIClient calls go through the shared agent loop (see bg_loop).
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_keepalive_connections=64,
+            max_connections=128,
+            keepalive_expiry=300,
+        ),
+        timeout=httpx.Timeout(30.0, connect=3.0),
+    )
+
+
+@functools.lru_cache(maxsize=128)
+def _build_messages(system: Optional[str], prompt: str) -> tuple:
+    """
+    Chat `messages` for a (system, prompt) pair, memoized.
+
+    Retries, hedged calls and repeated prompts reuse the same dicts instead
+    of rebuilding them. The tuple is shared — convert with list() at the
+    API call site and never mutate the dicts.
+    """
+    if system:
+        return ({"role": "system", "content": system}, {"role": "user", "content": prompt})
+    return ({"role": "user", "content": prompt},)
+
+
+def _turn_prefix_keys(turns) -> List[bytes]:
+    """keys[n] identifies turns[:n] — a running hash over roles and contents."""
+    h = hashlib.sha256()
+    keys = [h.digest()]
+    for msg in turns:
+        h.update(f"{msg.get('role', 'user')}\0{msg.get('content') or ''}\0".encode())
+        keys.append(h.digest())
+    return keys
+
+
+@functools.lru_cache(maxsize=1)
+def _token_counter() -> Callable[[str], int]:
+    """tiktoken's gpt-4o encoder when available, else a ~4 chars/token estimate."""
+    try:
+        import tiktoken
+        encoding = tiktoken.encoding_for_model("gpt-4o")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception as e:
+        logger.info(f"tiktoken unavailable ({e}) — estimating tokens from length")
+        return lambda text: len(text) // 4 + 1
+
+
+class _TokenBucket:
+    """
+    Async token bucket — `capacity` units refilled evenly over `period` seconds.
+
+    Used to throttle proactively (requests/min and tokens/min) so bursts wait
+    for capacity locally instead of colliding with provider 429s.
+    """
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self._level = self.capacity
+        self._last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._last) * self.rate)
+        self._last = now
+
+    async def acquire(self, amount: float = 1.0):
+        amount = min(float(amount), self.capacity)
+        while True:
+            self._refill()
+            if self._level >= amount:
+                self._level -= amount
+                return
+            await asyncio.sleep((amount - self._level) / self.rate)
+
+    def refund(self, amount: float):
+        if amount > 0:
+            self._refill()
+            self._level = min(self.capacity, self._level + amount)
+
+class _CircuitBreaker:
+    """
+    Consecutive-failure breaker for one provider.
+
+    After `threshold` failed calls in a row the provider is skipped for
+    `cooldown` seconds; then one trial call is let through per cooldown
+    window until a success closes the breaker again.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 60.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.fails = 0
+        self.opened_at = 0.0
+
+    def is_open(self) -> bool:
+        """Tripped and still cooling down. No side effects — safe for planning."""
+        return self.fails >= self.threshold and time.monotonic() - self.opened_at < self.cooldown
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go out now. Once the cooldown has passed this
+        claims the half-open trial, so only call it right before the request.
+        """
+        if self.fails < self.threshold:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at >= self.cooldown:
+            self.opened_at = now  # half-open: this caller is the trial
+            return True
+        return False
+
+    def record(self, ok: bool) -> bool:
+        """Update state; returns True if this failure just tripped the breaker."""
+        if ok:
+            self.fails = 0
+            return False
+        self.fails += 1
+        if self.fails >= self.threshold:
+            self.opened_at = time.monotonic()
+            return self.fails == self.threshold
+        return False
+
+
 @dataclass
 class AIResponse:
     """Response from AI model with metadata."""
@@ -29,6 +192,8 @@ class AIResponse:
     cost_usd: float
     fallback_used: bool
     error: Optional[str] = None
+    cached: bool = False
+    data: Optional[Any] = None  # parsed JSON when json_mode / json_schema was requested
 
 class AIClient:
     """
@@ -45,31 +210,55 @@ class AIClient:
         self.gemini_key = os.environ.get("GEMINI_API_KEY")
         self.openai_key = os.environ.get("OPENAI_API_KEY")
         self.openrouter_key = os.environ.get("OPENROUTER_API_KEY")
+
+        # Pooled HTTP/2 transport shared by OpenRouter and OpenAI Direct
+        self._http = _build_http_client()
         
+        if self.openrouter_key or self.openai_key:
+            from openai import AsyncOpenAI
+
         # 1. Initialize OpenRouter (Primary)
         self.client = None
         if self.openrouter_key:
             self.client = AsyncOpenAI(
                 api_key=self.openrouter_key,
-                base_url="https://openrouter.ai/api/v1"
+                base_url="https://openrouter.ai/api/v1",
+                http_client=self._http,
             )
             logger.info("OpenRouter AI Client initialized (Gemini 2.0 Flash via OpenRouter)")
             
         # 2. Initialize Gemini Direct (Secondary)
         self.gemini_model = None
         self.gemini_client = None
+        self._genai = None
+        self._genai_new = False
         if self.gemini_key:
-            if _GENAI_NEW:
+            # Prefer the new google.genai SDK; fall back to legacy google.generativeai
+            try:
+                import google.genai as genai
+                self._genai_new = True
+            except ImportError:
+                import google.generativeai as genai
+            self._genai = genai
+            if self._genai_new:
+                # Built once and reused — the client owns the pooled HTTP session
                 self.gemini_client = genai.Client(api_key=self.gemini_key)
             else:
                 genai.configure(api_key=self.gemini_key)
                 self.gemini_model = genai.GenerativeModel("gemini-2.0-flash")
             logger.info("Gemini 2.0 Flash (Direct) initialized.")
             
+        # The Gemini SDKs are blocking — run them on a bounded pool of their own
+        # so a burst of invoices can't starve the loop's default executor.
+        self._gemini_exec = concurrent.futures.ThreadPoolExecutor(
+            max_workers=int(os.environ.get("GEMINI_MAX_WORKERS", 32)),
+            thread_name_prefix="gemini",
+        )
+
         # 3. Initialize OpenAI Direct (Fallback)
         self.openai_client = None
         if self.openai_key:
-            self.openai_client = AsyncOpenAI(api_key=self.openai_key)
+            self.openai_client = AsyncOpenAI(api_key=self.openai_key, http_client=self._http)
             logger.info("GPT-4o (Direct) initialized.")
 
         # Log warnings for missing keys
@@ -84,98 +273,619 @@ class AIClient:
         self.fallback_model = "mistralai/mistral-small-3.1-24b-instruct:free"
         self._genai_model_name = "gemini-2.0-flash-lite"          # google.genai direct
 
-        # Cost tracking (approximate)
-        self.costs = {
-            "gemini-1.5-pro": {"input": 0.00035, "output": 0.00105}, # Per 1k
-            "gpt-4o": {"input": 0.005, "output": 0.015} # Per 1k
+        # Proactive rate limiting — size to the account's OpenRouter/OpenAI tier
+        self._rpm_bucket = _TokenBucket(int(os.environ.get("AI_RPM_LIMIT", 60)))
+        self._tpm_bucket = _TokenBucket(int(os.environ.get("AI_TPM_LIMIT", 100_000)))
+
+        # Hedged requests: launch the next provider if the first is slower than this.
+        # Off by default — a hedge pays for two calls; set it near the primary's p95.
+        self.hedge_ms = int(os.environ.get("HEDGE_MS", 0))
+
+        # Per-provider retries; backoff sleeps are capped at RETRY_BUDGET_S in total
+        self.max_retries = max(1, int(os.environ.get("AI_MAX_RETRIES", 5)))
+
+        # Response cache for near-deterministic (temperature <= CACHE_MAX_TEMPERATURE) completions
+        self._cache = build_response_cache()
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+
+        # Rolling history summaries, keyed by a hash of the turns they cover
+        self._summaries = LRUCache(maxsize=256)
+
+        # Skip providers that keep failing instead of paying retries+timeouts each call
+        self._breakers: Dict[str, _CircuitBreaker] = {
+            label: _CircuitBreaker() for label in ("OpenRouter", "Gemini Direct", "GPT-4o Direct")
         }
 
+        # Cost tracking (approximate)
+        self.costs = MODEL_COSTS
+
+        # max_tokens caps selectable via complete(profile=...)
+        self.profiles = MAX_TOKEN_PROFILES
+
+    CACHE_MAX_TEMPERATURE = 0.2  # hotter sampling is meant to vary — never cached
+
     async def complete(
         self, 
         prompt: str, 
         system: str = None, 
         json_mode: bool = False,
         temperature: float = 0.1,
-        max_tokens: int = 1000
+        max_tokens: int = 1000,
+        profile: Optional[str] = None,
+        json_schema: Optional[Dict[str, Any]] = None
     ) -> AIResponse:
-        """Execute a completion with robust fallback chain."""
-        start_time = time.time()
-        
-        # 1. Try OpenRouter (Primary)
-        if self.client:
-            response = await self._retry_call(
-                self._call_openrouter, prompt, system, json_mode, 
-                self.primary_model, temperature, max_tokens
-            )
-            if response:
-                return response
-        
-        # 2. Try Gemini Direct (Secondary)
-        if self.gemini_model:
-            logger.warning("Primary (OpenRouter) failed/missing, trying Gemini Direct")
-            response = await self._retry_call(
-                self._call_gemini, prompt, system, json_mode
+        """
+        Execute a completion with robust fallback chain.
+
+        `profile` ("classify", "extract", "reason", "health") overrides
+        `max_tokens` with the cap from MAX_TOKEN_PROFILES.
+
+        `json_schema` asks providers for schema-constrained output (implies
+        json_mode); with either, the parsed object is returned in `.data`.
+        """
+        start_ns = time.monotonic_ns()
+        if profile:
+            max_tokens = self.profiles[profile]
+        if json_schema is not None:
+            json_mode = True
+
+        cache_key = self._cache_key(
+            self.primary_model, system, prompt, json_mode, round(temperature, 2), max_tokens, json_schema
+        )
+        cacheable = temperature <= self.CACHE_MAX_TEMPERATURE
+        if cacheable:
+            hit = self._cache_get(cache_key)
+            if hit:
+                logger.info(f"AI cache hit [{hit.model_used}]")
+                return dataclasses.replace(hit, cached=True, latency_ms=0, cost_usd=0.0)
+
+        # Single-flight: identical in-flight requests share one provider call.
+        # Applies at any temperature — a burst of duplicate invoices only
+        # needs one answer even when it isn't worth caching afterwards.
+        loop = asyncio.get_running_loop()
+        flight = (loop, cache_key)
+        leader = self._inflight.get(flight)
+        if leader:
+            logger.info("AI request coalesced with identical in-flight call")
+            return await asyncio.shield(leader)
+        self._inflight[flight] = loop.create_future()
+
+        try:
+            response = await self._complete_uncached(
+                prompt, system, json_mode, temperature, max_tokens, start_ns, json_schema
             )
+            if json_mode:
+                response.data = self._parse_json(response.content)
+        except BaseException as e:
+            self._settle_flight(flight, error=e)
+            raise
+        if cacheable and not response.error:
+            self._cache_set(cache_key, response)
+        self._settle_flight(flight, response=response)
+        return response
+
+    def _settle_flight(self, flight, response: AIResponse = None, error: BaseException = None):
+        """Hand the leader's outcome to any coalesced waiters."""
+        future = self._inflight.pop(flight, None)
+        if future is None or future.done():
+            return
+        if isinstance(error, asyncio.CancelledError):
+            future.cancel()
+        elif error is not None:
+            future.set_exception(error)
+            future.exception()  # mark retrieved — waiters still receive it
+        else:
+            future.set_result(response)
+
+    def _cache_get(self, key: str) -> Optional[AIResponse]:
+        if self._cache is None:
+            return None
+        try:
+            data = self._cache.get(key)
+            return AIResponse(**data) if data else None
+        except Exception as e:
+            logger.warning(f"AI cache read failed: {e}")
+            return None
+
+    def _cache_set(self, key: str, response: AIResponse):
+        if self._cache is None:
+            return
+        try:
+            self._cache.set(key, dataclasses.asdict(response))
+        except Exception as e:
+            logger.warning(f"AI cache write failed: {e}")
+
+    @staticmethod
+    def _parse_json(content: Optional[str]) -> Optional[Any]:
+        """Parse a JSON completion; None if the model returned something else."""
+        if not content:
+            return None
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            return None
+
+    @staticmethod
+    def _response_format(json_mode: bool, json_schema: Optional[Dict[str, Any]]) -> Optional[dict]:
+        """OpenAI-style `response_format` for the requested output mode."""
+        if json_schema is not None:
+            return {
+                "type": "json_schema",
+                "json_schema": {"name": "resp", "schema": json_schema, "strict": True},
+            }
+        if json_mode:
+            return {"type": "json_object"}
+        return None
+
+    @staticmethod
+    def _cache_key(*parts) -> str:
+        """Stable hash of everything that determines a completion."""
+        raw = orjson.dumps(parts, option=orjson.OPT_SORT_KEYS, default=str)
+        return hashlib.blake2b(raw, digest_size=32).hexdigest()
+
+    async def _complete_uncached(
+        self, prompt, system, json_mode, temperature, max_tokens, start_ns, json_schema=None
+    ) -> AIResponse:
+        """Run the provider chain without consulting the response cache."""
+
+        # Ordered provider chain: (label, zero-arg coroutine factory, is_fallback)
+        providers = []
+        # 1. OpenRouter (Primary)
+        if self.client:
+            providers.append(("OpenRouter", functools.partial(
+                self._retry_call, self._call_openrouter, prompt, system, json_mode,
+                self.primary_model, temperature, max_tokens, json_schema
+            ), False))
+        # 2. Gemini Direct (Secondary)
+        if self.gemini_client or self.gemini_model:
+            providers.append(("Gemini Direct", functools.partial(
+                self._retry_call, self._call_gemini, prompt, system, json_mode, max_tokens, json_schema
+            ), True))
+        # 3. GPT-4o Direct (Fallback)
+        if self.openai_client:
+            providers.append(("GPT-4o Direct", functools.partial(
+                self._retry_call, self._call_gpt4o, prompt, system, json_mode, max_tokens, json_schema
+            ), True))
+
+        # Circuit breaker: drop providers that are currently tripped. A trial
+        # call is only claimed in _guarded_call, when the provider is used.
+        live = []
+        for label, call, is_fallback in providers:
+            if not self._breakers[label].is_open():
+                live.append((label, functools.partial(self._guarded_call, label, call), is_fallback))
+            else:
+                logger.info(f"{label} circuit open, skipping")
+        providers = live
+
+        # Hedge: if the first provider is slow, race it against the next one
+        if self.hedge_ms > 0 and len(providers) >= 2:
+            response = await self._hedged_call(providers[0], providers[1])
             if response:
-                response.fallback_used = True
                 return response
+            logger.warning(f"{providers[0][0]} and {providers[1][0]} both failed (hedged)")
+            providers = providers[2:]
 
-        # 3. Try GPT-4o Direct (Fallback)
-        if self.openai_client:
-            logger.warning("Gemini Direct failed/missing, trying GPT-4o Direct")
-            response = await self._retry_call(
-                self._call_gpt4o, prompt, system, json_mode
-            )
+        for label, call, is_fallback in providers:
+            response = await call()
             if response:
-                response.fallback_used = True
+                if is_fallback:
+                    response.fallback_used = True
                 return response
+            logger.warning(f"{label} failed, trying next provider")
 
         # 4. Final Rule-based Fallback
-        return self._rule_based_fallback(prompt, start_time)
+        return self._rule_based_fallback(prompt, start_ns)
+
+    async def _guarded_call(self, label, call) -> Optional[AIResponse]:
+        """Run a provider call and feed the outcome to its circuit breaker."""
+        breaker = self._breakers[label]
+        if not breaker.allow():
+            # Another request is already making the half-open trial call
+            logger.info(f"{label} circuit open, skipping")
+            return None
+        response = await call()
+        if breaker.record(response is not None):
+            logger.warning(
+                f"{label} failed {breaker.fails}x in a row — circuit open for {breaker.cooldown:.0f}s"
+            )
+        return response
+
+    async def _hedged_call(self, primary, secondary) -> Optional[AIResponse]:
+        """
+        Hedged request: start `primary`; if it has not answered within
+        HEDGE_MS, launch `secondary` in parallel and return whichever
+        succeeds first, cancelling the loser.
+        """
+        tasks = {asyncio.ensure_future(primary[1]()): primary}
+        done, _ = await asyncio.wait(tasks, timeout=self.hedge_ms / 1000)
+        if not done:
+            logger.warning(f"{primary[0]} slower than {self.hedge_ms}ms, hedging with {secondary[0]}")
+        elif not next(iter(done)).result():
+            logger.warning(f"{primary[0]} failed, trying {secondary[0]}")
+        else:
+            return next(iter(done)).result()
+        tasks[asyncio.ensure_future(secondary[1]())] = secondary
+
+        pending = {t for t in tasks if not t.done()}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    response = task.result()
+                    if response:
+                        if tasks[task][2]:
+                            response.fallback_used = True
+                        return response
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def complete_batch(
+        self,
+        prompts: List[str],
+        system: str = None,
+        json_mode: bool = False,
+        temperature: float = 0.1,
+        max_tokens: int = 1000,
+        batch_deadline: Optional[float] = None,
+    ) -> List[AIResponse]:
+        """
+        Complete many prompts at once; results are aligned with `prompts`.
+
+        With `batch_deadline` (seconds) and OpenAI Direct configured, the
+        prompts are submitted as one OpenAI Batch API job — cheaper, for
+        non-latency-critical work. Otherwise (or if the job misses the
+        deadline) they fan out concurrently through `complete()`, which
+        still applies caching, coalescing and the RPM/TPM throttle.
+        """
+        if batch_deadline and self.openai_client and prompts:
+            try:
+                return await self._openai_batch(prompts, system, json_mode, temperature, max_tokens, batch_deadline)
+            except Exception as e:
+                logger.warning(f"OpenAI Batch API failed ({e}) — falling back to concurrent completions")
+
+        return list(await asyncio.gather(*[
+            self.complete(p, system=system, json_mode=json_mode, temperature=temperature, max_tokens=max_tokens)
+            for p in prompts
+        ]))
+
+    async def _openai_batch(self, prompts, system, json_mode, temperature, max_tokens, deadline) -> List[AIResponse]:
+        """Submit prompts as an OpenAI Batch job and wait up to `deadline` seconds."""
+        start_ns = time.monotonic_ns()
+        lines = []
+        for i, prompt in enumerate(prompts):
+            body = {"model": "gpt-4o", "messages": list(_build_messages(system, prompt)), "temperature": temperature, "max_tokens": max_tokens}
+            if json_mode:
+                body["response_format"] = {"type": "json_object"}
+            lines.append(orjson.dumps({"custom_id": str(i), "method": "POST", "url": "/v1/chat/completions", "body": body}))
+
+        upload = await self.openai_client.files.create(
+            file=("batch.jsonl", b"\n".join(lines)), purpose="batch"
+        )
+        batch = await self.openai_client.batches.create(
+            input_file_id=upload.id, endpoint="/v1/chat/completions", completion_window="24h"
+        )
+        logger.info(f"OpenAI batch {batch.id} submitted ({len(prompts)} prompts)")
+
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            remaining = deadline - (time.monotonic_ns() - start_ns) / 1e9
+            if remaining <= 0:
+                await self.openai_client.batches.cancel(batch.id)
+                raise TimeoutError(f"batch {batch.id} not done within {deadline}s")
+            await asyncio.sleep(min(10.0, remaining))
+            batch = await self.openai_client.batches.retrieve(batch.id)
+
+        if batch.status != "completed" or not batch.output_file_id:
+            raise RuntimeError(f"batch {batch.id} ended with status '{batch.status}'")
+
+        output = await self.openai_client.files.content(batch.output_file_id)
+        latency = (time.monotonic_ns() - start_ns) // 1_000_000
+        results: List[Optional[AIResponse]] = [None] * len(prompts)
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            row = orjson.loads(line)
+            body = (row.get("response") or {}).get("body") or {}
+            if not body.get("choices"):
+                continue
+            tokens = (body.get("usage") or {}).get("total_tokens", 0)
+            results[int(row["custom_id"])] = AIResponse(
+                content=body["choices"][0]["message"]["content"],
+                model_used="gpt-4o-batch",
+                latency_ms=latency,
+                tokens_used=tokens,
+                # Batch API is billed at half the synchronous rate
+                cost_usd=(tokens / 1000) * MODEL_COSTS["gpt-4o"]["input"] * 0.5,
+                fallback_used=True
+            )
+
+        # Any request the batch dropped is retried synchronously
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing:
+            logger.warning(f"OpenAI batch {batch.id}: {len(missing)} request(s) failed, retrying individually")
+            retried = await asyncio.gather(*[
+                self.complete(prompts[i], system=system, json_mode=json_mode, temperature=temperature, max_tokens=max_tokens)
+                for i in missing
+            ])
+            for i, response in zip(missing, retried):
+                results[i] = response
+        return results
+
+    async def complete_stream(
+        self,
+        prompt: str,
+        system: str = None,
+        temperature: float = 0.1,
+        max_tokens: int = 1000,
+        on_complete: Optional[Callable[[AIResponse], None]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Stream a completion chunk-by-chunk from OpenRouter.
+
+        Yields text deltas as they arrive so callers can act on the first
+        tokens early. `on_complete` receives the aggregated AIResponse once
+        the stream ends. Without OpenRouter (or if it fails before the first
+        chunk) this degrades to a single chunk from `complete()`.
+        """
+        if not self.client:
+            response = await self.complete(prompt, system=system, temperature=temperature, max_tokens=max_tokens)
+            if on_complete:
+                on_complete(response)
+            yield response.content
+            return
+
+        messages = list(_build_messages(system, prompt))
+
+        reserved = await self._throttle(len(prompt), max_tokens)
+        start_ns = time.monotonic_ns()
+        parts: List[str] = []
+        tokens = 0
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.primary_model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            async for chunk in stream:
+                if chunk.usage:
+                    tokens = chunk.usage.total_tokens
+                if chunk.choices and chunk.choices[0].delta.content:
+                    delta = chunk.choices[0].delta.content
+                    parts.append(delta)
+                    yield delta
+        except Exception as e:
+            if parts:
+                raise
+            logger.warning(f"OpenRouter stream failed before first chunk, falling back: {e}")
+            response = await self.complete(prompt, system=system, temperature=temperature, max_tokens=max_tokens)
+            if on_complete:
+                on_complete(response)
+            yield response.content
+            return
+        finally:
+            self._tpm_bucket.refund(reserved - tokens)
+
+        latency = (time.monotonic_ns() - start_ns) // 1_000_000
+        logger.info(f"OpenRouter stream [{self.primary_model}]: {tokens} tokens, {latency}ms")
+        if on_complete:
+            on_complete(AIResponse(
+                content="".join(parts),
+                model_used=self.primary_model,
+                latency_ms=latency,
+                tokens_used=tokens,
+                cost_usd=0.0,
+                fallback_used=False
+            ))
 
     async def complete_with_memory(
         self, 
         prompt: str, 
         history: List[Dict[str, str]], 
-        system: str = None
+        system: str = None,
+        json_mode: bool = False,
+        temperature: float = 0.1,
+        max_tokens: int = 1000,
+        max_history_turns: int = 8,
+        summarize_beyond: bool = False
     ) -> AIResponse:
-        """Execute a completion with conversation history."""
-        context = ""
-        for msg in history:
-            role = msg.get("role", "user").upper()
-            content = msg.get("content", "")
-            context += f"{role}: {content}\n"
-        
+        """
+        Execute a completion with conversation history.
+
+        History is sent as native chat messages so the provider sees real
+        roles (and can reuse its prefix cache across turns). The direct
+        Gemini/GPT-4o fallbacks only take a single prompt, so they get the
+        history flattened into text.
+
+        Only the last `max_history_turns` turns are sent verbatim (fewer if
+        they still overflow MAX_CONTEXT_TOKENS), so per-call input stays
+        bounded instead of growing with the conversation. Older turns are
+        dropped, or with `summarize_beyond` replaced by a rolling summary
+        (one extra, small AI call on each turn that drops more history).
+        """
+        history = await self._fit_history(
+            history, system, prompt, max_tokens, max_history_turns, summarize_beyond
+        )
+        messages = ([{"role": "system", "content": system}] if system else []) + history
+        messages.append({"role": "user", "content": prompt})
+
+        if self.client:
+            response = await self._retry_call(
+                self._call_openrouter_msgs, messages, json_mode,
+                self.primary_model, temperature, max_tokens
+            )
+            if response:
+                return response
+            logger.warning("OpenRouter failed for multi-turn completion, flattening history for fallbacks")
+
+        context = "".join(
+            f"{msg.get('role', 'user').upper()}: {msg.get('content', '')}\n" for msg in history
+        )
         full_prompt = f"HISTORY:\n{context}\n\nNEW PROMPT: {prompt}"
-        return await self.complete(full_prompt, system=system)
+        return await self.complete(
+            full_prompt, system=system, json_mode=json_mode,
+            temperature=temperature, max_tokens=max_tokens
+        )
+
+    async def _fit_history(
+        self, history, system, prompt, max_tokens, max_turns=None, summarize=True
+    ) -> List[Dict[str, str]]:
+        """
+        Keep at most `max_turns` of the newest turns, then drop more until the
+        request fits the context window, summarizing what was dropped.
+        """
+        count = _token_counter()
+        budget = MAX_CONTEXT_TOKENS - max_tokens - CONTEXT_RESERVE_TOKENS
+        budget -= count(system or "") + count(prompt)
+        cut = max(0, len(history) - max_turns) if max_turns is not None else 0
+        sizes = [count(msg.get("content") or "") + 4 for msg in history[cut:]]
+        used = sum(sizes)
+        if cut == 0 and used <= budget:
+            return list(history)
+
+        for size in sizes:
+            if used <= budget:
+                break
+            used -= size
+            cut += 1
+        kept = list(history[cut:])
+        logger.info(f"History window — {'summarizing' if summarize else 'dropping'} {cut} oldest turn(s), keeping {len(kept)}")
+        if not summarize:
+            return kept
+
+        summary = await self._summarize_turns(history[:cut])
+        if summary and count(summary) + used <= budget:
+            kept.insert(0, {"role": "system", "content": f"Summary of earlier conversation: {summary}"})
+        return kept
+
+    async def _summarize_turns(self, turns) -> Optional[str]:
+        """
+        Condense dropped turns into a few sentences. Summaries are rolling:
+        the newest memoized summary of a prefix of `turns` is extended with
+        only the turns dropped since, so each call summarizes a bounded
+        slice instead of the whole transcript.
+        """
+        keys = _turn_prefix_keys(turns)
+        start, previous = 0, None
+        for n in range(len(turns), 0, -1):
+            previous = self._summaries.get(keys[n])
+            if previous is not None:
+                start = n
+                break
+        if start == len(turns):
+            return previous
+
+        transcript = "".join(
+            f"{msg.get('role', 'user').upper()}: {msg.get('content', '')}\n" for msg in turns[start:]
+        )
+        if previous:
+            transcript = f"SUMMARY SO FAR: {previous}\n\nNEW TURNS:\n{transcript}"
+        response = await self.complete(
+            transcript,
+            system="Summarize this conversation in at most 5 sentences. Keep names, amounts, IDs and decisions.",
+            temperature=0.0,
+            max_tokens=256,
+        )
+        if response.error:
+            return previous
+        self._summaries[keys[-1]] = response.content
+        return response.content
+
+    RETRY_BUDGET_S = 30.0  # total backoff sleep allowed per provider call
+    RETRY_CAP_S = 16.0     # ceiling for a single computed backoff
 
     async def _retry_call(self, func, *args):
-        """Standardized retry logic with 30s timeout and exponential backoff."""
-        for attempt in range(3):
+        """
+        Standardized retry logic with 30s timeout and jittered exponential backoff.
+
+        Waits `Retry-After` when a 429 provides one, otherwise
+        min(16, 2**attempt) seconds scaled by a random 0.5–1.5 factor so
+        concurrent workers don't retry in lockstep. Only transient failures
+        are retried (see _is_transient) — a 400/401/403 fails fast. Never
+        raises on provider failure — returns None after the final attempt (or
+        once the backoff budget is spent) so `complete()` can fall through to
+        the next provider.
+        """
+        slept = 0.0
+        for attempt in range(self.max_retries):
+            last = attempt == self.max_retries - 1
             try:
                 return await asyncio.wait_for(func(*args), timeout=30.0)
             except asyncio.TimeoutError:
                 logger.error(f"Timeout (30s) for {func.__name__} on attempt {attempt+1}")
-                if attempt == 2:
+                if last:
                     return None
+                error = None
             except Exception as e:
-                if attempt == 2:
+                if last:
                     logger.error(f"Final attempt failed for {func.__name__}: {e}")
-                    return None 
-                delay = 1 if attempt == 0 else 2
-                logger.warning(f"Attempt {attempt+1} failed for {func.__name__}. Retrying in {delay}s... Error: {e}")
-                await asyncio.sleep(delay)
+                    return None
+                if not self._is_transient(e):
+                    logger.error(f"Non-retryable error from {func.__name__}: {e}")
+                    return None
+                error = e
+
+            delay = self._retry_after(error) if error is not None else None
+            if delay is None:
+                delay = min(self.RETRY_CAP_S, 2 ** attempt) * random.uniform(0.5, 1.5)
+            if slept + delay > self.RETRY_BUDGET_S:
+                logger.error(f"Retry budget ({self.RETRY_BUDGET_S:.0f}s) exhausted for {func.__name__}: {error}")
+                return None
+            slept += delay
+            logger.warning(f"Attempt {attempt+1} failed for {func.__name__}. Retrying in {delay:.1f}s... Error: {error}")
+            await asyncio.sleep(delay)
         return None
 
-    async def _call_openrouter(self, prompt, system, json_mode, model, temperature, max_tokens):
+    # Provider exceptions that mean "network trouble" (SDKs are imported lazily,
+    # so openai's classes are matched by name)
+    _TRANSIENT_ERROR_NAMES = frozenset({"APIConnectionError", "APITimeoutError"})
+
+    @classmethod
+    def _is_transient(cls, error: Exception) -> bool:
+        """True for 408/409/429/5xx responses and connection/timeout errors."""
+        status = getattr(error, "status_code", None)
+        if not isinstance(status, int):
+            status = getattr(error, "code", None)  # google.genai APIError
+        if isinstance(status, int):
+            return status in (408, 409, 429) or status >= 500
+        if isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError)):
+            return True
+        return any(c.__name__ in cls._TRANSIENT_ERROR_NAMES for c in type(error).__mro__)
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        """Seconds requested by a 429's Retry-After header, if any."""
+        if getattr(error, "status_code", None) != 429:
+            return None
+        try:
+            return float(error.response.headers.get("Retry-After"))
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    async def _throttle(self, prompt_chars: int, max_tokens: int) -> int:
+        """Wait for RPM/TPM capacity; returns the number of tokens reserved."""
+        reserved = prompt_chars // 4 + max_tokens
+        await self._rpm_bucket.acquire()
+        await self._tpm_bucket.acquire(reserved)
+        return reserved
+
+    async def _call_openrouter(self, prompt, system, json_mode, model, temperature, max_tokens, json_schema=None):
         """OpenRouter API call (OpenAI-compatible)."""
-        messages = []
-        if system:
-            messages.append({"role": "system", "content": system})
-        messages.append({"role": "user", "content": prompt})
-        
-        start = time.time()
+        messages = list(_build_messages(system, prompt))
+        return await self._call_openrouter_msgs(messages, json_mode, model, temperature, max_tokens, json_schema)
+
+    async def _call_openrouter_msgs(self, messages, json_mode, model, temperature, max_tokens, json_schema=None):
+        """OpenRouter call with a prepared chat `messages` list."""
+        prompt_chars = sum(len(m.get("content") or "") for m in messages)
+        reserved = await self._throttle(prompt_chars, max_tokens)
+        start_ns = time.monotonic_ns()
         
+        if model.startswith("anthropic/"):
+            messages = self._mark_cache_breakpoint(messages)
+
         kwargs = {
             "model": model,
             "messages": messages,
@@ -183,13 +893,21 @@ class AIClient:
             "max_tokens": max_tokens,
         }
         
-        if json_mode:
-            kwargs["response_format"] = {"type": "json_object"}
+        response_format = self._response_format(json_mode, json_schema)
+        if response_format:
+            kwargs["response_format"] = response_format
 
-        response = await self.client.chat.completions.create(**kwargs)
+        try:
+            response = await self.client.chat.completions.create(**kwargs)
+        except BaseException:
+            # Error, timeout or a lost hedge race: nothing was spent against
+            # the budget we can count, so give the reservation back
+            self._tpm_bucket.refund(reserved)
+            raise
         
-        latency = int((time.time() - start) * 1000)
+        latency = (time.monotonic_ns() - start_ns) // 1_000_000
         tokens = response.usage.total_tokens if response.usage else 0
+        self._tpm_bucket.refund(reserved - tokens)
         cost = 0.0  # OpenRouter handles billing
 
         logger.info(f"OpenRouter [{model}]: {tokens} tokens, {latency}ms")
@@ -203,38 +921,80 @@ class AIClient:
             fallback_used=False
         )
 
-    async def _call_gemini(self, prompt, system, json_mode):
+    @staticmethod
+    def _mark_cache_breakpoint(messages):
+        """
+        Anthropic models only cache a prefix up to an explicit breakpoint: tag
+        the last leading system message (instructions + summary) as one.
+        """
+        last = -1
+        for i, msg in enumerate(messages):
+            if msg.get("role") != "system":
+                break
+            last = i
+        if last < 0 or not isinstance(messages[last].get("content"), str):
+            return messages
+        marked = list(messages)
+        marked[last] = {
+            "role": "system",
+            "content": [{
+                "type": "text",
+                "text": messages[last]["content"],
+                "cache_control": {"type": "ephemeral"},
+            }],
+        }
+        return marked
+
+    async def _call_gemini(self, prompt, system, json_mode, max_tokens=1000, json_schema=None):
         """Gemini Implementation (Direct) — supports both old and new SDK."""
         full_prompt = f"System: {system}\n\n{prompt}" if system else prompt
-        start = time.time()
-
-        if _GENAI_NEW and self.gemini_key:
-            import google.genai as g
-            client = g.Client(api_key=self.gemini_key)
-            resp_mime = "application/json" if json_mode else "text/plain"
-            response = await asyncio.to_thread(
-                client.models.generate_content,
-                model=self._genai_model_name,
-                contents=full_prompt,
-                config={"temperature": 0.1, "response_mime_type": resp_mime},
-            )
-            text = response.text
-            latency = int((time.time() - start) * 1000)
-            tokens = getattr(getattr(response, 'usage_metadata', None), 'total_token_count', 0) or 0
-        else:
-            config = genai.types.GenerationConfig(
-                temperature=0.1,
-                response_mime_type="application/json" if json_mode else "text/plain"
-            )
-            response = await asyncio.to_thread(
-                self.gemini_model.generate_content,
-                full_prompt,
-                generation_config=config
-            )
-            text = response.text
-            latency = int((time.time() - start) * 1000)
-            tokens = getattr(getattr(response, 'usage_metadata', None), 'total_token_count', 0) or 0
+        reserved = await self._throttle(len(full_prompt), max_tokens)
+        start_ns = time.monotonic_ns()
+
+        try:
+            if self._genai_new:
+                resp_mime = "application/json" if json_mode else "text/plain"
+                gen_config = {
+                    "temperature": 0.1,
+                    "response_mime_type": resp_mime,
+                    "max_output_tokens": max_tokens,
+                }
+                if json_schema is not None:
+                    gen_config["response_json_schema"] = json_schema
+                response = await asyncio.get_running_loop().run_in_executor(
+                    self._gemini_exec,
+                    functools.partial(
+                        self.gemini_client.models.generate_content,
+                        model=self._genai_model_name,
+                        contents=full_prompt,
+                        config=gen_config,
+                    ),
+                )
+                text = response.text
+                latency = (time.monotonic_ns() - start_ns) // 1_000_000
+                tokens = getattr(getattr(response, 'usage_metadata', None), 'total_token_count', 0) or 0
+            else:
+                config = self._genai.types.GenerationConfig(
+                    temperature=0.1,
+                    max_output_tokens=max_tokens,
+                    response_mime_type="application/json" if json_mode else "text/plain"
+                )
+                response = await asyncio.get_running_loop().run_in_executor(
+                    self._gemini_exec,
+                    functools.partial(
+                        self.gemini_model.generate_content,
+                        full_prompt,
+                        generation_config=config
+                    ),
+                )
+                text = response.text
+                latency = (time.monotonic_ns() - start_ns) // 1_000_000
+                tokens = getattr(getattr(response, 'usage_metadata', None), 'total_token_count', 0) or 0
+        except BaseException:
+            self._tpm_bucket.refund(reserved)
+            raise
 
+        self._tpm_bucket.refund(reserved - tokens)
         cost = (tokens / 1000) * 0.00015  # flash-8b pricing
         logger.info(f"Gemini Direct call: {tokens} tokens, {latency}ms")
 
@@ -247,24 +1007,28 @@ class AIClient:
             fallback_used=False
         )
 
-    async def _call_gpt4o(self, prompt, system, json_mode):
+    async def _call_gpt4o(self, prompt, system, json_mode, max_tokens=1000, json_schema=None):
         """GPT-4o Implementation (Direct)."""
-        messages = []
-        if system:
-            messages.append({"role": "system", "content": system})
-        messages.append({"role": "user", "content": prompt})
+        messages = list(_build_messages(system, prompt))
 
-        start = time.time()
-        response = await self.openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            temperature=0.1,
-            response_format={"type": "json_object"} if json_mode else {"type": "text"}
-        )
+        reserved = await self._throttle(len(prompt), max_tokens)
+        start_ns = time.monotonic_ns()
+        try:
+            response = await self.openai_client.chat.completions.create(
+                model="gpt-4o",
+                messages=messages,
+                temperature=0.1,
+                max_tokens=max_tokens,
+                response_format=self._response_format(json_mode, json_schema) or {"type": "text"}
+            )
+        except BaseException:
+            self._tpm_bucket.refund(reserved)
+            raise
         
-        latency = int((time.time() - start) * 1000)
+        latency = (time.monotonic_ns() - start_ns) // 1_000_000
         tokens = response.usage.total_tokens
-        cost = (tokens / 1000) * self.costs["gpt-4o"]["input"]
+        self._tpm_bucket.refund(reserved - tokens)
+        cost = (tokens / 1000) * MODEL_COSTS["gpt-4o"]["input"]
 
         logger.info(f"GPT-4o Direct call: {tokens} tokens, {latency}ms")
 
@@ -277,7 +1041,7 @@ class AIClient:
             fallback_used=True
         )
 
-    def _rule_based_fallback(self, prompt: str, start_time: float) -> AIResponse:
+    def _rule_based_fallback(self, prompt: str, start_ns: int) -> AIResponse:
         """Smart rule-based fallback — extracts real data from prompt when AI fails."""
         logger.error("All AI APIs failed - using rule-based fallback")
 
@@ -286,16 +1050,13 @@ class AIClient:
         if "invoice" in prompt.lower() or "vendor" in prompt.lower():
             # Extract what we can via regex
             vendor = None
-            m = re.search(r'FROM:\s*(.+)', prompt, re.IGNORECASE)
+            m = _RE_VENDOR.search(prompt)
             if m:
                 vendor = m.group(1).strip()[:60]
 
             amount = 0.0
-            for pat in [
-                r'\$\s*([\d,]+\.\d{2})',
-                r'(?:amount|total)[:\s]+\$?\s*([\d,]+\.?\d*)',
-            ]:
-                am = re.search(pat, prompt, re.IGNORECASE)
+            for pat in _RE_AMOUNTS:
+                am = pat.search(prompt)
                 if am:
                     try:
                         amount = float(am.group(1).replace(',', ''))
@@ -304,11 +1065,11 @@ class AIClient:
                         pass
 
             inv_num = "UNKNOWN"
-            im = re.search(r'(?:invoice|inv)\s*#?\s*:?\s*([A-Z0-9\-]{3,20})', prompt, re.IGNORECASE)
+            im = _RE_INVOICE_NO.search(prompt)
             if im:
                 inv_num = im.group(1)
 
-            content = json.dumps({
+            content = orjson.dumps({
                 "is_procurement": True,
                 "doc_type": "invoice",
                 "vendor_name": vendor,
@@ -316,12 +1077,12 @@ class AIClient:
                 "amount": amount,
                 "confidence": 0.4,
                 "error": "AI quota exceeded — regex fallback"
-            })
+            }).decode()
 
         return AIResponse(
             content=content,
             model_used="rule_based",
-            latency_ms=int((time.time() - start_time) * 1000),
+            latency_ms=(time.monotonic_ns() - start_ns) // 1_000_000,
             tokens_used=0,
             cost_usd=0.0,
             fallback_used=True,
@@ -329,50 +1090,83 @@ class AIClient:
         )
 
     async def health_check(self) -> dict:
-        """Quickly test all configured APIs."""
-        results = {}
-        
-        # Check OpenRouter
-        if self.client:
-            try:
-                response = await self._call_openrouter(
-                    "Say OK", "test", False, self.primary_model, 0.1, 10
-                )
-                if response:
-                    results["openrouter"] = "ok"
-                else:
-                    results["openrouter"] = "fail"
-            except Exception as e:
-                results["openrouter"] = f"fail: {str(e)}"
-        else:
-             results["openrouter"] = "not_configured"
+        """Quickly test all configured APIs (probes run concurrently)."""
+        results = await asyncio.gather(
+            self._probe_openrouter(), self._probe_gemini(), self._probe_openai()
+        )
+        return dict(results)
 
-        # Check Gemini Direct
-        if self.gemini_model:
-            try:
-                await self._call_gemini("hi", "test", False)
-                results["gemini_direct"] = "ok"
-            except Exception as e:
-                results["gemini_direct"] = f"fail: {str(e)}"
-        else:
-             results["gemini_direct"] = "not_configured"
+    async def _probe_openrouter(self):
+        if not self.client:
+            return "openrouter", "not_configured"
+        try:
+            response = await self._call_openrouter(
+                "Say OK", "test", False, self.primary_model, 0.1, self.profiles["health"]
+            )
+            return "openrouter", "ok" if response else "fail"
+        except Exception as e:
+            return "openrouter", f"fail: {str(e)}"
+
+    async def _probe_gemini(self):
+        if not (self.gemini_client or self.gemini_model):
+            return "gemini_direct", "not_configured"
+        try:
+            await self._call_gemini("hi", "test", False, self.profiles["health"])
+            return "gemini_direct", "ok"
+        except Exception as e:
+            return "gemini_direct", f"fail: {str(e)}"
+
+    async def _probe_openai(self):
+        if not self.openai_client:
+            return "openai_direct", "not_configured"
+        try:
+            await self._call_gpt4o("hi", "test", False, self.profiles["health"])
+            return "openai_direct", "ok"
+        except Exception as e:
+            return "openai_direct", f"fail: {str(e)}"
 
-        # Check OpenAI Direct
+    async def warmup(self) -> dict:
+        """
+        Open connections to each configured provider ahead of the first request,
+        so DNS + TCP + TLS are paid at startup rather than by a user call.
+        """
+        probes = {}
+        if self.client:
+            probes["openrouter"] = self._http.head("https://openrouter.ai/api/v1/models", timeout=5.0)
         if self.openai_client:
-            try:
-                await self._call_gpt4o("hi", "test", False)
-                results["openai_direct"] = "ok"
-            except Exception as e:
-                results["openai_direct"] = f"fail: {str(e)}"
-        else:
-            results["openai_direct"] = "not_configured"
-            
-        return results
+            probes["openai_direct"] = self._http.head("https://api.openai.com/v1/models", timeout=5.0)
+        if self.gemini_client:
+            probes["gemini_direct"] = asyncio.get_running_loop().run_in_executor(
+                self._gemini_exec, lambda: next(iter(self.gemini_client.models.list()), None)
+            )
+        results = await asyncio.gather(*probes.values(), return_exceptions=True)
+        status = {
+            name: f"fail: {r}" if isinstance(r, Exception) else "warm"
+            for name, r in zip(probes, results)
+        }
+        logger.info(f"AI provider warmup: {status}")
+        return status
+
+    async def aclose(self):
+        """Release pooled connections and threads (call on worker shutdown)."""
+        await self._http.aclose()
+        self._gemini_exec.shutdown(wait=False, cancel_futures=True)
 
-# Singleton interface
-_client = None
-def get_ai_client():
+# Singleton interface — built at import when a provider key is already in the
+# environment; otherwise created on first use (e.g. keys loaded from .env later).
+_PROVIDER_KEYS = ("OPENROUTER_API_KEY", "GEMINI_API_KEY", "OPENAI_API_KEY")
+_client: Optional[AIClient] = AIClient() if any(os.environ.get(k) for k in _PROVIDER_KEYS) else None
+
+def get_ai_client() -> AIClient:
+    return _client or _create_ai_client()
+
+def _create_ai_client() -> AIClient:
     global _client
     if _client is None:
         _client = AIClient()
     return _client
+
+async def close_ai_client():
+    """Close the singleton's connection pool if it was ever created."""
+    if _client is not None:
+        await _client.aclose()
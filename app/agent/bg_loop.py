@@ -0,0 +1,50 @@
+"""
+Background Event Loop
+
+One long-lived asyncio loop on a daemon thread, for the synchronous agent
+code that needs to await coroutines (AI matching, alerts, email fetch).
+
+Reusing a single loop keeps AIClient's pooled HTTP connections warm between
+invoices — a fresh new_event_loop() per call throws them away and pays a
+new TLS handshake every time. Those pooled connections are bound to this
+loop, so every AI coroutine must run here: sync code uses run_sync(),
+async code on another loop (FastAPI routes, startup) awaits run_async().
+"""
+
+import asyncio
+import atexit
+import concurrent.futures
+import threading
+import logging
+
+logger = logging.getLogger("AgentLoop")
+
+_loop = None
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared background loop, starting its thread on first use."""
+    global _loop
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="agent-async", daemon=True).start()
+            atexit.register(_loop.call_soon_threadsafe, _loop.stop)
+            logger.info("Background event loop started")
+    return _loop
+
+
+def run_sync(coro, timeout: float = None):
+    """Run `coro` on the background loop and block for its result."""
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+
+
+async def run_async(coro):
+    """Await `coro` from another event loop while it runs on the background loop."""
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, get_loop()))
@@ -2,7 +2,8 @@ import logging
 import datetime
 from sqlalchemy.orm import Session
 from .. import models
-from ..services.notifications import send_sms_to_owner
+from ..database import SessionLocal
+from ..services.notifications import notify_in_background, send_sms_to_owner
 
 logger = logging.getLogger("InventoryAgent")
 
@@ -15,19 +16,22 @@ def check_inventory_levels(db: Session):
     
     # Corrected logic: check for LOW stock (quantity <= reorder_threshold)
     items_to_refill = db.query(models.InventoryItem).filter(
-        models.InventoryItem.quantity <= models.InventoryItem.reorder_threshold
+        models.InventoryItem.stock_quantity <= models.InventoryItem.reorder_level
     ).all()
     
-    for item in items_to_refill:
-        # Check if we already have a pending alert for this item to avoid spam
-        existing_event = db.query(models.Event).filter(
+    # Items that already have a pending alert (avoid spam) — one query,
+    # reading just item_id out of the JSON payload in SQL
+    alerted_ids = {
+        item_id for (item_id,) in db.query(models.Event.payload["item_id"].as_integer()).filter(
             models.Event.event_type == "STOCK_ALERT",
             models.Event.status == "PENDING"
-        ).all()
-        
-        is_already_alerted = any(e.payload.get("item_id") == item.id for e in existing_event)
-        
-        if not is_already_alerted:
+        )
+    }
+    
+    new_rows = []
+    pending_sms = []
+    for item in items_to_refill:
+        if item.id not in alerted_ids:
             logger.warning(f"🚨 Low Stock Alert: {item.name} is at {item.quantity} (Threshold: {item.reorder_threshold})")
             
             # Create Event for UI/Audit
@@ -44,11 +48,10 @@ def check_inventory_levels(db: Session):
                 payload=alert_payload,
                 status="PENDING"
             )
-            db.add(new_event)
+            new_rows.append(new_event)
             
-            # Record SMS Log
+            # Record SMS Log (sent after the commit below)
             sms_msg = f"ProcureIQ Alert: {item.name} is running low ({item.quantity} left). Threshold is {item.reorder_threshold}. Suggest reordering {item.reorder_quantity} units."
-            send_sms_to_owner(sms_msg)
             
             # Create AlertLog with correct fields
             alert_log = models.AlertLog(
@@ -58,7 +61,32 @@ def check_inventory_levels(db: Session):
                 sms_sent=True,
                 email_sent=False # Emails sent via owner_actions after approval
             )
-            db.add(alert_log)
-            db.commit()
+            new_rows.append(alert_log)
+            pending_sms.append((alert_log, sms_msg))
+
+    # One transaction for the whole scan
+    if new_rows:
+        db.add_all(new_rows)
+        db.commit()
+
+    # Fire-and-forget: the log row says sms_sent=True until the send reports otherwise
+    for alert_log, sms_msg in pending_sms:
+        future = notify_in_background(send_sms_to_owner, sms_msg)
+        future.add_done_callback(lambda f, log_id=alert_log.id: _reconcile_sms(log_id, f))
             
     return len(items_to_refill)
+
+
+def _reconcile_sms(alert_log_id: int, future):
+    """Flip AlertLog.sms_sent back to False if the background send didn't go out."""
+    if future.exception() is None and future.result():
+        return
+    db = SessionLocal()
+    try:
+        db.query(models.AlertLog).filter(models.AlertLog.id == alert_log_id).update({"sms_sent": False})
+        db.commit()
+    except Exception as e:
+        logger.error(f"Could not record SMS failure for alert {alert_log_id}: {e}")
+        db.rollback()
+    finally:
+        db.close()
@@ -8,10 +8,27 @@ NO direct db.query() calls to Vendor, VendorAlias, PO, or Receipt models.
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.attributes import flag_modified
 from .. import models, crud
+from ..services.erp_adapter import erp_adapter
+from ..services.ai_service import analyze_invoice_with_ai
+from .bg_loop import run_sync
+import asyncio
+import difflib
 import logging
+import os
+
+try:
+    from rapidfuzz import fuzz, process as fuzz_process
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
 
 logger = logging.getLogger("DecisionEngine")
 
+AI_MATCH_TIMEOUT_S = 120  # upper bound on one AI match, including provider retries
+
+# Deterministic name similarity at/above which the AI vendor match is skipped
+FUZZY_MATCH_THRESHOLD = int(os.environ.get("FUZZY_MATCH_THRESHOLD", 85))
+
 def calculate_confidence(raw_name: str, candidate_name: str) -> int:
     """
     Calculate vendor name match confidence score.
@@ -38,6 +55,44 @@ def calculate_confidence(raw_name: str, candidate_name: str) -> int:
     logger.debug(f"Fuzzy match: '{raw_name}' vs '{candidate_name}' -> 50")
     return 50
 
+# A raw name much shorter or longer than the candidate is a fragment
+# ("Limited", "Tech") or a different company, however similar its words.
+MIN_NAME_LENGTH_RATIO = 0.6
+
+def _name_similarity(raw: str, names: list):
+    """Best (similarity, index) over `names` — full-string, word-order-insensitive."""
+    if RAPIDFUZZ_AVAILABLE:
+        _, similarity, idx = fuzz_process.extractOne(raw, names, scorer=fuzz.token_sort_ratio)
+        return similarity, idx
+    key = " ".join(sorted(raw.split()))
+    ratios = [difflib.SequenceMatcher(None, key, " ".join(sorted(n.split()))).ratio() * 100 for n in names]
+    idx = max(range(len(names)), key=ratios.__getitem__)
+    return ratios[idx], idx
+
+def best_vendor_match(raw_name: str, vendors: list):
+    """
+    Find the known vendor whose name is closest to `raw_name`.
+
+    Similarity (0-100) compares whole names with RapidFuzz token_sort_ratio
+    over the full vendor list in one call; partial scorers such as WRatio
+    rate a generic word ("Limited") as a near-certain match. Candidates
+    failing the length guard get similarity 0. The returned confidence uses
+    the transparent tiers of calculate_confidence().
+
+    Returns (vendor, confidence, similarity), or None for an empty list.
+    """
+    if not raw_name or not vendors:
+        return None
+    raw = raw_name.lower().strip()
+    names = [(v.get("name") or "").lower().strip() for v in vendors]
+
+    similarity, idx = _name_similarity(raw, names)
+    vendor = vendors[idx]
+    lengths = sorted((len(raw), len(names[idx])))
+    if not lengths[1] or lengths[0] / lengths[1] < MIN_NAME_LENGTH_RATIO:
+        similarity = 0
+    return vendor, calculate_confidence(raw_name, vendor.get("name") or ""), similarity
+
 def calculate_three_way_confidence(vendor_match: bool, po_match: bool, receipt_exists: bool) -> int:
     """
     Three-way match confidence:
@@ -62,18 +117,93 @@ def process_invoice_match(db: Session, payload: dict):
     
     Steps:
     1. Create/fetch invoice record
-    2. Check vendor alias (via adapter) — LEARNING applies here
+    2. Check vendor alias (via adapter) — LEARNING applies here,
+       then (no email body only) a fuzzy name match; either one skips step 3
     3. AI vendor matching (via adapter for vendor list)
     4. PO + Receipt lookup (via adapter)
     5. Calculate confidence
     6. Set status for human review (STRICT OWNER APPROVAL)
     """
-    from ..services.erp_adapter import erp_adapter
-    
+    ctx = _start_match(db, payload)
+    if ctx["needs_ai"]:
+        # Get vendor list from ERP Adapter (NOT direct DB)
+        known_vendors = erp_adapter.get_vendors()
+        logger.info(f"[MATCH] ERP Adapter returned {len(known_vendors)} vendors for matching")
+        try:
+            # Shared background loop — keeps the AI client's connection pool warm
+            ai_result = run_sync(
+                analyze_invoice_with_ai(ctx["raw_vendor"], ctx["amount"], known_vendors, ctx["raw_text"]),
+                timeout=AI_MATCH_TIMEOUT_S,
+            )
+        except Exception as e:
+            ai_result = e
+        _apply_ai_result(ctx, ai_result)
+    _finish_match(db, ctx)
+
+
+def process_invoice_batch(db: Session, payloads: list) -> list:
+    """
+    Match many invoices at once: the AI calls for every invoice without a
+    learned alias run concurrently, then the DB writes happen one by one on
+    the caller's session (sessions are not safe to share across tasks).
+
+    Returns one entry per payload — None on success, or the Exception that
+    stopped that invoice — so the caller can mark each event DONE/FAILED.
+    """
+    errors = [None] * len(payloads)
+    contexts = [None] * len(payloads)
+    for i, payload in enumerate(payloads):
+        try:
+            contexts[i] = _start_match(db, payload)
+        except Exception as e:
+            db.rollback()
+            errors[i] = e
+
+    pending = [ctx for ctx in contexts if ctx and ctx["needs_ai"]]
+    if pending:
+        # One vendor list for the whole batch
+        known_vendors = erp_adapter.get_vendors()
+        logger.info(f"[MATCH] Batch of {len(pending)} AI match(es) against {len(known_vendors)} vendors")
+
+        async def _analyze_all():
+            return await asyncio.gather(
+                *(analyze_invoice_with_ai(c["raw_vendor"], c["amount"], known_vendors, c["raw_text"]) for c in pending),
+                return_exceptions=True,
+            )
+
+        try:
+            results = run_sync(_analyze_all(), timeout=AI_MATCH_TIMEOUT_S)
+        except Exception as e:
+            results = [e] * len(pending)
+        for ctx, ai_result in zip(pending, results):
+            _apply_ai_result(ctx, ai_result)
+
+    for i, ctx in enumerate(contexts):
+        if ctx is None:
+            continue
+        try:
+            _finish_match(db, ctx)
+        except Exception as e:
+            logger.error(f"[PROCESS] Invoice {ctx['invoice_number']} failed: {e}")
+            db.rollback()
+            errors[i] = e
+    return errors
+
+
+def _load_raw_text(db: Session, payload: dict):
+    """Email body for the event — inline for simulated events, else from event_blob."""
+    if not payload.get("raw_text_blob"):
+        return payload.get("raw_text")
+    body = db.get(models.EventBlob, payload.get("event_id"))
+    return body.body.decode() if body and body.body else None
+
+
+def _start_match(db: Session, payload: dict) -> dict:
+    """Steps 1–2: create/fetch the invoice, try the learned alias, then a fuzzy name match."""
     invoice_number = payload.get("invoiceNumber")
     raw_vendor = payload.get("vendorName")
     amount = payload.get("invoiceAmount")
-    raw_text = payload.get("raw_text")
+    raw_text = _load_raw_text(db, payload)
     
     logger.info(f"[PROCESS] Analyzing invoice {invoice_number} | vendor='{raw_vendor}' | amount={amount}")
     
@@ -85,92 +215,110 @@ def process_invoice_match(db: Session, payload: dict):
             total_amount=amount,
             status="PROCESSING",
             extracted_data={"raw_vendor": raw_vendor, "email_body": raw_text},
-            audit_trail=[{"t": "received", "m": f"Source: {'Real Email' if raw_text else 'Simulation'}"}]
+            audit_events=[models.InvoiceAuditEvent(
+                type="received", message=f"Source: {'Real Email' if raw_text else 'Simulation'}"
+            )],
         )
         db.add(invoice)
         db.commit()
-        db.refresh(invoice)
+
+    ctx = {
+        "invoice": invoice,
+        "invoice_number": invoice_number,
+        "raw_vendor": raw_vendor,
+        "amount": amount,
+        "raw_text": raw_text,
+        "match_score": 0,
+        "reasoning": "",
+        "target_vendor_id": None,
+        "needs_ai": False,
+    }
 
     # ── Step 2: Check vendor alias via ERP Adapter (LEARNING) ──
-    match_score = 0
-    reasoning = ""
-    target_vendor_id = None
-    po_matched = False
-    receipt_found = False
-    
     # ALL alias lookups go through the adapter — NO direct DB query
     alias_result = erp_adapter.get_vendor_alias(raw_vendor)
     
     if alias_result:
-        target_vendor_id = alias_result["vendor_id"]
-        match_score = alias_result["confidence"]
-        reasoning = f"Autonomous Match: Learned alias '{raw_vendor}' found in ontology (confidence={match_score}%)."
-        logger.info(f"[LEARNING] Alias applied: '{raw_vendor}' → vendor_id={target_vendor_id}, confidence improved to {match_score}%")
-    else:
-        # ── Step 3: AI vendor matching ─────────────────────────
-        # Get vendor list from ERP Adapter (NOT direct DB)
-        known_vendors = erp_adapter.get_vendors()
-        logger.info(f"[MATCH] ERP Adapter returned {len(known_vendors)} vendors for matching")
+        ctx["target_vendor_id"] = alias_result["vendor_id"]
+        ctx["match_score"] = alias_result["confidence"]
+        ctx["reasoning"] = f"Autonomous Match: Learned alias '{raw_vendor}' found in ontology (confidence={ctx['match_score']}%)."
+        logger.info(f"[LEARNING] Alias applied: '{raw_vendor}' → vendor_id={ctx['target_vendor_id']}, confidence improved to {ctx['match_score']}%")
+        return ctx
+
+    # ── Step 2b: Deterministic fuzzy match (skips the LLM) ─────
+    # Only without an email body: with one, the AI also extracts the amount
+    # and vendor from the text, which a name match can't replace.
+    best = None if raw_text else best_vendor_match(raw_vendor, erp_adapter.get_vendors())
+    if best and best[2] >= FUZZY_MATCH_THRESHOLD:
+        vendor, confidence, similarity = best
+        ctx["target_vendor_id"] = vendor["id"]
+        # Stored score uses the transparent tiers, not the raw similarity
+        ctx["match_score"] = confidence
+        ctx["reasoning"] = (
+            f"Deterministic Match: '{raw_vendor}' ≈ '{vendor['name']}' "
+            f"(similarity={similarity:.0f}%, confidence={confidence}%), AI not needed."
+        )
+        logger.info(f"[MATCH] Fuzzy fast-path: '{raw_vendor}' → vendor_id={vendor['id']} (confidence={confidence}%)")
+        return ctx
+
+    # ── Step 3: AI vendor matching (run by the caller) ─────────
+    ctx["needs_ai"] = True
+    return ctx
+
+
+def _apply_ai_result(ctx: dict, ai_result):
+    """Step 3 outcome: fold an AI analysis (or the exception it raised) into `ctx`."""
+    invoice = ctx["invoice"]
+    try:
+        if isinstance(ai_result, BaseException):
+            raise ai_result
+
+        if ctx["raw_text"]:
+            invoice.total_amount = ai_result.get("extracted_amount", invoice.total_amount)
+            invoice.extracted_data["raw_vendor"] = ai_result.get("extracted_vendor", ctx["raw_vendor"])
         
-        from ..services.ai_service import analyze_invoice_with_ai
-        import asyncio
+        ctx["match_score"] = ai_result.get("confidence", 0)
+        ctx["reasoning"] = ai_result.get("reasoning", "AI Analysis failed to provide reasoning.")
+        ctx["target_vendor_id"] = ai_result.get("best_match_id")
         
-        try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            ai_result = loop.run_until_complete(analyze_invoice_with_ai(raw_vendor, amount, known_vendors, raw_text))
-            loop.close()
-            
-            if raw_text:
-                invoice.total_amount = ai_result.get("extracted_amount", invoice.total_amount)
-                invoice.extracted_data["raw_vendor"] = ai_result.get("extracted_vendor", raw_vendor)
-            
-            match_score = ai_result.get("confidence", 0)
-            reasoning = ai_result.get("reasoning", "AI Analysis failed to provide reasoning.")
-            target_vendor_id = ai_result.get("best_match_id")
-            
-            logger.info(f"[AI] Analysis: vendor_id={target_vendor_id}, confidence={match_score}%, reasoning={reasoning}")
-            
-        except Exception as e:
-            logger.error(f"[AI] Matcher Error: {str(e)}")
-            match_score = 40
-            reasoning = "AI Service unavailable or parsing error."
+        logger.info(f"[AI] Analysis: vendor_id={ctx['target_vendor_id']}, confidence={ctx['match_score']}%, reasoning={ctx['reasoning']}")
+        
+    except Exception as e:
+        logger.error(f"[AI] Matcher Error: {str(e)}")
+        ctx["match_score"] = 40
+        ctx["reasoning"] = "AI Service unavailable or parsing error."
+
+
+def _finish_match(db: Session, ctx: dict):
+    """Steps 4–6: three-way match, decision, audit trail, commit."""
+    invoice = ctx["invoice"]
+    invoice_number = ctx["invoice_number"]
+    amount = ctx["amount"]
+    match_score = ctx["match_score"]
+    reasoning = ctx["reasoning"]
+    target_vendor_id = ctx["target_vendor_id"]
+    po_matched = False
+    receipt_found = False
 
     # ── Step 4: Three-way match (PO + Receipt via adapter) ─────
     if target_vendor_id:
         try:
-            pos = erp_adapter.get_purchase_orders(vendor_id=target_vendor_id)
-            
-            if pos:
-                matching_po = None
-                for po in pos:
-                    if po.get("total_amount") and abs(po["total_amount"] - float(amount or 0)) < 0.01:
-                        matching_po = po
-                        break
-                
-                if not matching_po and pos:
-                    matching_po = pos[0]
+            matching_po = erp_adapter.find_matching_po(target_vendor_id, amount)
+            if not matching_po:
+                pos = erp_adapter.get_purchase_orders(vendor_id=target_vendor_id)
+                matching_po = pos[0] if pos else None
+
+            if matching_po:
+                po_matched = True
+                invoice.add_audit(db, "po_match", f"Matched PO: {matching_po.get('po_number', matching_po.get('id'))}")
                 
-                if matching_po:
-                    po_matched = True
-                    invoice.audit_trail.append({
-                        "t": "po_match",
-                        "m": f"Matched PO: {matching_po.get('po_number', matching_po.get('id'))}"
-                    })
-                    
-                    receipts = erp_adapter.get_goods_receipts(matching_po["id"])
-                    if receipts:
-                        receipt_found = True
-                        invoice.audit_trail.append({
-                            "t": "receipt_verified",
-                            "m": f"Receipt confirmed: {len(receipts)} delivery record(s) found"
-                        })
-                    else:
-                        invoice.audit_trail.append({
-                            "t": "receipt_missing",
-                            "m": "No goods receipt found for matched PO"
-                        })
-            
+                receipts = erp_adapter.get_goods_receipts(matching_po["id"])
+                if receipts:
+                    receipt_found = True
+                    invoice.add_audit(db, "receipt_verified", f"Receipt confirmed: {len(receipts)} delivery record(s) found")
+                else:
+                    invoice.add_audit(db, "receipt_missing", "No goods receipt found for matched PO")
+        
             three_way_score = calculate_three_way_confidence(
                 vendor_match=target_vendor_id is not None,
                 po_match=po_matched,
@@ -198,24 +346,13 @@ def process_invoice_match(db: Session, payload: dict):
         sys_state = db.query(models.SystemState).first()
         if sys_state and sys_state.current_mode == "SAFE":
             invoice.status = "MANUAL_REVIEW"
-            invoice.audit_trail.append({
-                "t": "safe_mode",
-                "m": "Safe Mode Activated — Low AI Confidence. Invoice forced to manual review."
-            })
+            invoice.add_audit(db, "safe_mode", "Safe Mode Activated — Low AI Confidence. Invoice forced to manual review.")
             logger.info(f"[SAFE-MODE] Invoice {invoice_number} forced to MANUAL_REVIEW")
     except Exception as sm_err:
         logger.error(f"[SAFE-MODE] Check error (non-fatal): {sm_err}")
     
-    invoice.audit_trail.append({
-        "t": "match_attempt", 
-        "score": match_score, 
-        "note": reasoning
-    })
-    invoice.audit_trail.append({
-        "t": "ready_for_review", 
-        "m": f"Match confidence {match_score}%. Queued for owner review."
-    })
-    flag_modified(invoice, "audit_trail")
+    invoice.add_audit(db, "match_attempt", score=match_score, note=reasoning)
+    invoice.add_audit(db, "ready_for_review", f"Match confidence {match_score}%. Queued for owner review.")
     flag_modified(invoice, "extracted_data")
     
     db.commit()
@@ -10,18 +10,255 @@ ENTERPRISE DATABASE RULES:
 
 The agent IS the background process.
 It works whether the UI is running or not.
+
+WAKE-UP:
+- Committing a new Event in this process wakes the loop immediately —
+  on SQLite a per-connection TEMP trigger catches ORM, Core and raw-SQL
+  inserts alike
+- On Postgres, an INSERT trigger NOTIFYs `event_pending` so writes from
+  other processes wake it too
+- Polling with backoff (2s → 30s) remains as the safety net
 """
 
 import time
 import datetime
-import asyncio
+import functools
 import logging
+import select
+import threading
+from sqlalchemy import event as sa_event, insert, text
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
-from ..database import SessionLocal
-from .. import models
+from ..database import AgentSessionLocal, engine
+from .. import crud, models
+from .bg_loop import run_sync
+from ..services.alert_service import process_stock_alerts
+from ..services.email_service import EmailIngestionService
+from ..services.notifications import deliver_outbox
+from ..services.severity_engine import calculate_system_state
 
 logger = logging.getLogger("Agent")
 
+# ── Wake signal ───────────────────────────────────────────────────────────────
+_wake = threading.Event()
+
+
+def notify_event_pending():
+    """Wake the agent loop early — call after committing new PENDING events."""
+    _wake.set()
+
+
+# An Event insert flags the pooled connection; the flag turns into a wake-up
+# when the connection is checked back in (i.e. after its COMMIT has landed)
+# and is dropped if the transaction rolls back.
+
+_SQLITE_WAKE_TRIGGER = """
+    CREATE TEMP TRIGGER IF NOT EXISTS events_wake_agent AFTER INSERT ON main.events
+    WHEN NEW.status = 'PENDING' BEGIN SELECT agent_event_inserted(); END
+"""
+
+
+@sa_event.listens_for(models.Event, "after_insert")
+def _flag_event_insert(mapper, connection, target):
+    connection.info["event_inserted"] = True
+
+
+@sa_event.listens_for(engine, "rollback")
+def _clear_on_rollback(conn):
+    conn.info.pop("event_inserted", None)
+
+
+@sa_event.listens_for(engine, "checkin")
+def _wake_on_checkin(dbapi_conn, connection_record):
+    if connection_record is not None and connection_record.info.pop("event_inserted", False):
+        _wake.set()
+
+
+if engine.dialect.name == "sqlite":
+    @sa_event.listens_for(engine, "checkout")
+    def _install_wake_trigger(dbapi_conn, connection_record, connection_proxy):
+        """
+        SQLite has no LISTEN/NOTIFY (and Python's sqlite3 exposes no update
+        hook), so each connection gets a TEMP trigger calling back into this
+        process. Retried on later checkouts until the events table exists.
+        """
+        if connection_record.info.get("wake_trigger"):
+            return
+        info = connection_record.info
+        dbapi_conn.create_function(
+            "agent_event_inserted", 0, lambda: info.__setitem__("event_inserted", True)
+        )
+        try:
+            dbapi_conn.execute(_SQLITE_WAKE_TRIGGER)
+            info["wake_trigger"] = True
+        except Exception:
+            pass  # events table not created yet
+
+
+_PG_NOTIFY_DDL = (
+    """
+    CREATE OR REPLACE FUNCTION notify_event_pending() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('event_pending', NEW.id::text);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS events_notify_pending ON events",
+    """
+    CREATE TRIGGER events_notify_pending AFTER INSERT ON events
+    FOR EACH ROW WHEN (NEW.status = 'PENDING') EXECUTE FUNCTION notify_event_pending()
+    """,
+)
+
+
+def _start_pg_listener():
+    """Postgres only: LISTEN event_pending on a dedicated connection and set the wake signal."""
+    if engine.dialect.name != "postgresql":
+        return
+    try:
+        with engine.begin() as conn:
+            for ddl in _PG_NOTIFY_DDL:
+                conn.execute(text(ddl))
+    except Exception as e:
+        logger.warning(f"[AGENT] Could not install NOTIFY trigger, polling only: {e}")
+        return
+
+    def _listen():
+        while True:
+            raw = None
+            try:
+                raw = engine.raw_connection()
+                pg = raw.driver_connection
+                pg.autocommit = True
+                pg.cursor().execute("LISTEN event_pending")
+                logger.info("[AGENT] Listening on Postgres channel 'event_pending'")
+                while True:
+                    if select.select([pg], [], [], 60) == ([], [], []):
+                        continue
+                    pg.poll()
+                    if pg.notifies:
+                        pg.notifies.clear()
+                        _wake.set()
+            except Exception as e:
+                logger.warning(f"[AGENT] LISTEN connection lost ({e}), reconnecting in 5s")
+                time.sleep(5)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.invalidate()
+                    except Exception:
+                        pass
+
+    threading.Thread(target=_listen, name="agent-listen", daemon=True).start()
+
+@functools.lru_cache(maxsize=None)
+def _invoice_matcher():
+    """
+    matcher imports erp_adapter, which queries the DB when first imported —
+    resolve it on first use (after create_all), then reuse it.
+    """
+    from .matcher import process_invoice_batch
+    return process_invoice_batch
+
+
+CLAIM_BATCH_SIZE = 50  # events claimed per poll
+HEARTBEAT_INTERVAL_S = 30  # min seconds between heartbeat writes
+FULL_SWEEP_INTERVAL_S = 60  # idle polls ignore the watermark at most this often
+
+
+def _upsert_heartbeat(db: Session):
+    """
+    Mark the agent healthy in one INSERT ... ON CONFLICT DO UPDATE. Not
+    committed here — it rides along with the event-claim commit.
+    """
+    upsert = postgresql.insert if engine.dialect.name == "postgresql" else sqlite.insert
+    now = datetime.datetime.now()
+    stmt = upsert(models.SystemStatus).values(service_name="agent", status="healthy", last_heartbeat=now)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.SystemStatus.service_name],
+        set_={"status": "healthy", "last_heartbeat": now},
+    ))
+
+
+STOCK_CHECK_INTERVAL_S = 60
+EMAIL_CHECK_INTERVAL_S = 300
+OUTBOX_CHECK_INTERVAL_S = 60
+
+
+def _run_stock_alerts():
+    """Periodic job: flag low-stock items (own session)."""
+    logger.info(f"[AGENT] Running stock alert check...")
+    db = AgentSessionLocal()
+    try:
+        result = run_sync(process_stock_alerts(db))
+        if result.get('low_stock_items', 0) > 0:
+            logger.info(f"[AGENT] Stock alerts: {result['low_stock_items']} items flagged")
+    finally:
+        db.close()
+
+
+def _ingest_email():
+    """
+    Periodic job: turn new invoice emails into PENDING events. The mailbox
+    fetch happens before a session is opened, so no connection is held
+    during it; the commit wakes the event loop through the insert hook.
+    """
+    logger.info(f"[AGENT] Checking for invoice emails...")
+    email_service = EmailIngestionService()
+    invoices = run_sync(email_service.fetch_latest_invoices())
+    if not invoices:
+        return
+
+    logger.info(f"[AGENT] Found {len(invoices)} invoice emails")
+    # One executemany INSERT — no per-row ORM unit-of-work
+    rows = [
+        {
+            "event_type": "INVOICE_RECEIVED",
+            "payload": {
+                "invoiceNumber": invoice['invoice_number'],
+                "vendorName": invoice['vendor_name'],
+                "invoiceAmount": invoice['amount'],
+                "raw_text_blob": True,  # body lives in event_blob
+                "source": "email",
+                "email_subject": invoice['subject'],
+                "email_from": invoice['from'],
+                "email_date": invoice['date'],
+                "extraction_confidence": invoice['confidence']
+            },
+            "status": "PENDING",
+        }
+        for invoice in invoices
+    ]
+    db = AgentSessionLocal()
+    try:
+        event_ids = db.scalars(
+            insert(models.Event).returning(models.Event.id, sort_by_parameter_order=True),
+            rows,
+        ).all()
+        db.execute(insert(models.EventBlob), [
+            {"event_id": event_id, "body": (invoice['body'] or "").encode()}
+            for event_id, invoice in zip(event_ids, invoices)
+        ])
+        db.commit()
+        logger.info(f"[AGENT] Created {len(invoices)} PENDING events from email")
+    finally:
+        db.close()
+
+
+def _start_periodic_job(name: str, interval_s: float, job):
+    """Run `job` now and then every `interval_s` on a daemon thread; errors are logged, not fatal."""
+    def _run():
+        while True:
+            try:
+                job()
+            except Exception as e:
+                logger.error(f"[AGENT] {name} error: {e}")
+            time.sleep(interval_s)
+
+    threading.Thread(target=_run, name=f"agent-{name}", daemon=True).start()
+
+
 # ── Agent state (readable by /api/agent-status) ───────────────────────────────
 _worker_state = {
     "status": "starting",
@@ -38,6 +275,10 @@ def start_agent_loop():
     """
     Autonomous agent loop — single source of truth is the database.
     
+    Stock alerts, email ingestion and notification-outbox retries run on
+    their own threads (see _start_periodic_job), so a slow mailbox fetch
+    never delays event claims.
+
     Every poll cycle:
     1. Opens a FRESH db session (sees latest committed state)
     2. Claims PENDING events by setting status → PROCESSING (atomic lock)
@@ -51,73 +292,83 @@ def start_agent_loop():
     - UI sees agent writes immediately (via polling)
     """
     wait_time = 2
-    last_stock_check = 0
-    last_email_check = 0
-    STOCK_CHECK_INTERVAL = 60
-    EMAIL_CHECK_INTERVAL = 300
+    last_heartbeat = float("-inf")
+    # High-water mark: highest event id claimed so far. Polls only look past
+    # it; an idle poll occasionally sweeps from 0 to pick up rows committed
+    # out of id order (concurrent Postgres writers).
+    last_seen_id = 0
+    last_full_sweep = time.monotonic()
     
     logger.info("=" * 60)
     logger.info("[AGENT] Procure-IQ Autonomous Agent STARTED")
     logger.info(f"[AGENT] Timestamp: {datetime.datetime.now().isoformat()}")
     logger.info(f"[AGENT] Database: Single shared SQLite (WAL mode)")
-    logger.info(f"[AGENT] Poll interval: {wait_time}s (backoff to 30s when idle)")
+    logger.info(f"[AGENT] Poll interval: {wait_time}s (backoff to 30s when idle, woken on new events)")
     logger.info("=" * 60)
     
+    _start_pg_listener()
+    _start_periodic_job("stock-alerts", STOCK_CHECK_INTERVAL_S, _run_stock_alerts)
+    _start_periodic_job("email-ingest", EMAIL_CHECK_INTERVAL_S, _ingest_email)
+    _start_periodic_job("notification-outbox", OUTBOX_CHECK_INTERVAL_S, deliver_outbox)
     _worker_state["status"] = "running"
     
     while True:
         _worker_state["last_run"] = datetime.datetime.now().isoformat()
         _worker_state["cycles_today"] += 1
         # FRESH session every cycle — always sees latest committed state
-        db = SessionLocal()
+        db = AgentSessionLocal()
         try:
-            # ── Heartbeat ──────────────────────────────────────
-            try:
-                status = db.query(models.SystemStatus).filter(
-                    models.SystemStatus.service_name == "agent"
-                ).first()
-                if not status:
-                    status = models.SystemStatus(service_name="agent", status="healthy")
-                    db.add(status)
-                status.last_heartbeat = datetime.datetime.now()
-                status.status = "healthy"
-                db.commit()
-            except Exception as e:
-                logger.error(f"[AGENT] Heartbeat failed: {e}")
-                db.rollback()
+            # ── Heartbeat (at most every HEARTBEAT_INTERVAL_S) ─
+            if time.monotonic() - last_heartbeat >= HEARTBEAT_INTERVAL_S:
+                try:
+                    _upsert_heartbeat(db)
+                    last_heartbeat = time.monotonic()
+                except Exception as e:
+                    logger.error(f"[AGENT] Heartbeat failed: {e}")
+                    db.rollback()
 
             # ── Poll for PENDING events ────────────────────────
-            current_time = time.time()
+            _wake.clear()  # anything committed after this point re-wakes us
             logger.info(f"[AGENT] Polling for PENDING events...")
             
-            events = db.query(models.Event).filter(
-                models.Event.status == 'PENDING'
-            ).all()
+            # ── LOCK: Claim events (PENDING → PROCESSING) ──
+            events = crud.claim_pending_events(db, last_seen_id, CLAIM_BATCH_SIZE)
+            if not events and last_seen_id and time.monotonic() - last_full_sweep >= FULL_SWEEP_INTERVAL_S:
+                events = crud.claim_pending_events(db, batch_size=CLAIM_BATCH_SIZE)
+                last_full_sweep = time.monotonic()
+            if events:
+                last_seen_id = max(last_seen_id, events[-1].id)
+            if len(events) == CLAIM_BATCH_SIZE:
+                _wake.set()  # more are queued — go again without backing off
             
             if events:
                 wait_time = 2  # Reset backoff
-                logger.info(f"[AGENT] Found {len(events)} PENDING event(s)")
-                
+                logger.info(f"[AGENT] ── Locked {len(events)} event(s) (PROCESSING) ──")
+
+                # ── Invoice matching: AI calls for the whole batch run concurrently ──
+                invoice_events = [e for e in events if e.event_type == "INVOICE_RECEIVED"]
+                match_errors = {}
+                if invoice_events:
+                    for event in invoice_events:
+                        vendor = event.payload.get('vendorName', 'Unknown')
+                        amount = event.payload.get('invoiceAmount', 0)
+                        logger.info(f"[AGENT] Processing INVOICE_RECEIVED: vendor='{vendor}', amount={amount}")
+                    try:
+                        errors = _invoice_matcher()(db, [dict(e.payload, event_id=e.id) for e in invoice_events])
+                    except Exception as batch_err:
+                        db.rollback()
+                        errors = [batch_err] * len(invoice_events)
+                    match_errors = {e.id: err for e, err in zip(invoice_events, errors)}
+
                 for event in events:
-                    # ── LOCK: Claim event (PENDING → PROCESSING) ──
-                    event.status = 'PROCESSING'
-                    db.commit()
-                    logger.info(f"[AGENT] ── Locked event {event.id} (PROCESSING) ──")
-                    
                     try:
                         if event.event_type == "INVOICE_RECEIVED":
-                            vendor = event.payload.get('vendorName', 'Unknown')
-                            amount = event.payload.get('invoiceAmount', 0)
-                            logger.info(f"[AGENT] Processing INVOICE_RECEIVED: vendor='{vendor}', amount={amount}")
-                            
-                            from ..agent.matcher import process_invoice_match
-                            process_invoice_match(db, event.payload)
-                            
+                            if match_errors.get(event.id):
+                                raise match_errors[event.id]
                             logger.info(f"[AGENT] ✓ Invoice match computed, DB updated")
 
                             # ── Decision Intelligence Hook (additive) ──────
                             try:
-                                from ..services.severity_engine import calculate_system_state
                                 confidence = event.payload.get("extraction_confidence", 75)
                                 if isinstance(confidence, str):
                                     confidence = float(confidence)
@@ -160,67 +411,14 @@ def start_agent_loop():
             else:
                 logger.debug(f"[AGENT] No PENDING events (backoff: {wait_time}s)")
             
-            # ── Stock alerts ───────────────────────────────────
-            if current_time - last_stock_check >= STOCK_CHECK_INTERVAL:
-                logger.info(f"[AGENT] Running stock alert check...")
-                try:
-                    from ..services.alert_service import process_stock_alerts
-                    
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    result = loop.run_until_complete(process_stock_alerts(db))
-                    loop.close()
-                    
-                    if result.get('low_stock_items', 0) > 0:
-                        logger.info(f"[AGENT] Stock alerts: {result['low_stock_items']} items flagged")
-                    last_stock_check = current_time
-                except Exception as e:
-                    logger.error(f"[AGENT] Stock alert error: {e}")
-                    last_stock_check = current_time
-            
-            # ── Email ingestion ────────────────────────────────
-            if current_time - last_email_check >= EMAIL_CHECK_INTERVAL:
-                logger.info(f"[AGENT] Checking for invoice emails...")
-                try:
-                    from ..services.email_service import EmailIngestionService
-                    email_service = EmailIngestionService()
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    invoices = loop.run_until_complete(email_service.fetch_latest_invoices())
-                    loop.close()
-                    
-                    if invoices:
-                        logger.info(f"[AGENT] Found {len(invoices)} invoice emails")
-                        for invoice in invoices:
-                            event = models.Event(
-                                event_type="INVOICE_RECEIVED",
-                                payload={
-                                    "invoiceNumber": invoice['invoice_number'],
-                                    "vendorName": invoice['vendor_name'],
-                                    "invoiceAmount": invoice['amount'],
-                                    "raw_text": invoice['body'],
-                                    "source": "email",
-                                    "email_subject": invoice['subject'],
-                                    "email_from": invoice['from'],
-                                    "email_date": invoice['date'],
-                                    "extraction_confidence": invoice['confidence']
-                                },
-                                status="PENDING"
-                            )
-                            db.add(event)
-                        db.commit()
-                        logger.info(f"[AGENT] Created {len(invoices)} PENDING events from email")
-                    last_email_check = current_time
-                except Exception as e:
-                    logger.error(f"[AGENT] Email check error: {e}")
-                    last_email_check = current_time
-            
             # ── Backoff ────────────────────────────────────────
             if not events:
-                time.sleep(wait_time)
-                wait_time = min(wait_time * 2, 30)
+                if _wake.wait(wait_time):
+                    wait_time = 2
+                else:
+                    wait_time = min(wait_time * 2, 30)
             else:
-                time.sleep(2)
+                _wake.wait(2)
 
         except KeyboardInterrupt:
             logger.info(f"\n[AGENT] Shutdown requested. Agent stopped cleanly.")
@@ -229,11 +427,17 @@ def start_agent_loop():
             logger.error(f"[AGENT] Loop error: {e}")
             _worker_state["last_error"] = str(e)
             _worker_state["status"] = "error"
-            time.sleep(wait_time)
+            _wake.wait(wait_time)
             wait_time = min(wait_time * 2, 30)
             _worker_state["status"] = "running"
         finally:
             # ALWAYS close the session — next cycle gets a fresh one
             db.close()
+
+    try:
+        from .ai_client import close_ai_client
+        run_sync(close_ai_client(), timeout=10)
+    except Exception as e:
+        logger.warning(f"[AGENT] AI client shutdown error: {e}")
     
     logger.info(f"[AGENT] Procure-IQ Autonomous Agent TERMINATED")
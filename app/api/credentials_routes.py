@@ -2,7 +2,7 @@
 API routes for credential management.
 Keys are NEVER returned in plaintext unless the user has just re-authenticated.
 """
-import datetime
+import time
 from fastapi import APIRouter, Request, HTTPException, Depends
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
@@ -17,22 +17,28 @@ from ..credentials import (
 
 router = APIRouter(prefix="/api/credentials", tags=["credentials"])
 
+# Keys the API may read or write — fixed at import
+_CATALOGUE_KEYS: frozenset[str] = frozenset(CREDENTIAL_CATALOGUE)
+
+
+SECRETS_REAUTH_WINDOW_S = 300  # 5 minutes
+
+
+def mark_secrets_verified(request: Request):
+    """Record a successful re-auth (called by POST /auth/reauth)."""
+    request.session["secrets_verified"] = True
+    request.session["secrets_verified_at"] = int(time.time())
+
 
 def _is_secrets_verified(request: Request) -> bool:
     """
     Check that the user completed re-auth within the last 5 minutes.
+    `secrets_verified_at` is a Unix timestamp (int seconds).
     """
     if not request.session.get("secrets_verified"):
         return False
-    verified_at_str = request.session.get("secrets_verified_at")
-    if not verified_at_str:
-        return False
-    try:
-        verified_at = datetime.datetime.fromisoformat(verified_at_str)
-        elapsed = (datetime.datetime.utcnow() - verified_at).total_seconds()
-        return elapsed < 300  # 5 minutes
-    except Exception:
-        return False
+    ts = request.session.get("secrets_verified_at")
+    return isinstance(ts, int) and int(time.time()) - ts < SECRETS_REAUTH_WINDOW_S
 
 
 # ─── List all credentials (masked) ───────────────────────
@@ -52,7 +58,7 @@ async def list_credentials(request: Request):
 async def reveal_credential(key: str, request: Request):
     """
     Returns the PLAINTEXT value of a credential.
-    Requires Google re-authentication (verified in last 5 minutes).
+    Requires password re-authentication (verified in last 5 minutes).
     """
     user = request.session.get("user")
     if not user:
@@ -63,12 +69,12 @@ async def reveal_credential(key: str, request: Request):
             status_code=403,
             content={
                 "error": "reauth_required",
-                "message": "Google re-authentication required to view secrets.",
+                "message": "Re-authentication required to view secrets.",
                 "reauth_url": "/auth/reauth"
             }
         )
 
-    if key not in CREDENTIAL_CATALOGUE:
+    if key not in _CATALOGUE_KEYS:
         raise HTTPException(status_code=404, detail="Unknown credential key")
 
     value = get_plaintext_for_verified_user(key)
@@ -91,7 +97,7 @@ async def save_credential(body: CredentialUpdate, request: Request, db: Session
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    if body.key not in CREDENTIAL_CATALOGUE:
+    if body.key not in _CATALOGUE_KEYS:
         raise HTTPException(status_code=400, detail=f"Unknown key '{body.key}'")
 
     if not body.value or not body.value.strip():
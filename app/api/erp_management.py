@@ -8,6 +8,9 @@ Provides:
 """
 
 from fastapi import APIRouter, Depends
+from sqlalchemy import update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 import datetime
 import logging
@@ -15,7 +18,7 @@ import logging
 import sys, os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from app.database import get_db
+from app.database import get_db, get_db_read
 from app import models
 from app.services.erp_adapter import erp_adapter
 
@@ -25,7 +28,7 @@ router = APIRouter(prefix="/api/erp", tags=["erp"])
 
 
 @router.get("/current")
-def get_current_connection(db: Session = Depends(get_db)):
+def get_current_connection(db: Session = Depends(get_db_read)):
     """Return info about the currently active ERP connection."""
     active = db.query(models.ERPConnection).filter(
         models.ERPConnection.is_active == True
@@ -86,37 +89,49 @@ def save_connection(data: dict, db: Session = Depends(get_db)):
         if not connection_name:
             connection_name = f"{erp_type.upper()} Connection"
 
-        # Deactivate all existing connections
-        db.query(models.ERPConnection).update({"is_active": False})
-
-        # Check if connection with same name exists
-        existing = db.query(models.ERPConnection).filter(
-            models.ERPConnection.connection_name == connection_name
-        ).first()
-
-        if existing:
-            existing.erp_type = erp_type
-            existing.api_url = data.get("api_url")
-            existing.api_key = data.get("api_key")
-            existing.database_name = data.get("database_name")
-            existing.username = data.get("username")
-            existing.is_active = True
-            existing.test_status = "success" if erp_type == "python_db" else "untested"
-            existing.last_tested = datetime.datetime.utcnow() if erp_type == "python_db" else None
-        else:
-            new_conn = models.ERPConnection(
-                connection_name=connection_name,
-                erp_type=erp_type,
-                api_url=data.get("api_url"),
-                api_key=data.get("api_key"),
-                database_name=data.get("database_name"),
-                username=data.get("username"),
-                is_active=True,
-                test_status="success" if erp_type == "python_db" else "untested",
-                last_tested=datetime.datetime.utcnow() if erp_type == "python_db" else None,
-            )
-            db.add(new_conn)
+        is_python = erp_type == "python_db"
+        fields = {
+            "erp_type": erp_type,
+            "api_url": data.get("api_url"),
+            "api_key": data.get("api_key"),
+            "database_name": data.get("database_name"),
+            "username": data.get("username"),
+            "is_active": True,
+            "test_status": "success" if is_python else "untested",
+            "last_tested": datetime.datetime.utcnow() if is_python else None,
+        }
 
+        # Deactivate whichever other connection is active (at most one row,
+        # found through the partial index), then insert-or-update by name.
+        Conn = models.ERPConnection
+        db.execute(
+            update(Conn)
+            .where(Conn.is_active.is_(True), Conn.connection_name != connection_name)
+            .values(is_active=False)
+        )
+        upsert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+        try:
+            with db.begin_nested():
+                db.execute(
+                    upsert(Conn)
+                    .values(connection_name=connection_name, **fields)
+                    .on_conflict_do_update(index_elements=[Conn.connection_name], set_=fields)
+                )
+        except DBAPIError as e:
+            # No unique index on connection_name yet (ensure_indexes could not
+            # build it): update the first row with this name, or insert one
+            logger.warning(f"ERP connection upsert unavailable, saving by lookup: {e}")
+            existing = db.query(Conn).filter(Conn.connection_name == connection_name).order_by(Conn.id).first()
+            if existing:
+                for key, value in fields.items():
+                    setattr(existing, key, value)
+            else:
+                existing = Conn(connection_name=connection_name, **fields)
+                db.add(existing)
+            db.flush()
+            db.execute(
+                update(Conn).where(Conn.is_active.is_(True), Conn.id != existing.id).values(is_active=False)
+            )
         db.commit()
 
         # Refresh the singleton adapter
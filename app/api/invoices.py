@@ -7,19 +7,19 @@ get higher confidence automatically.
 """
 
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy.orm.attributes import flag_modified
 from typing import List
 from .. import crud, models, schemas
-from ..database import get_db
+from ..database import get_async_db, get_db
 import logging
 
 router = APIRouter()
 logger = logging.getLogger("InvoiceAPI")
 
 @router.get("/invoices", response_model=List[schemas.Invoice])
-def read_invoices(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    invoices = crud.get_invoices(db, skip=skip, limit=limit)
+async def read_invoices(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    invoices = await crud.get_invoices(db, skip=skip, limit=limit)
     return invoices
 
 @router.get("/invoices/{invoice_id}", response_model=schemas.Invoice)
@@ -64,7 +64,7 @@ def approve_invoice(invoice_id: int, db: Session = Depends(get_db)):
         vendor_info = erp_adapter.get_vendor_by_id(db_invoice.vendor_id)
         canonical_name = vendor_info["name"] if vendor_info else None
         
-        if canonical_name and raw_vendor.lower().strip() != canonical_name.lower().strip():
+        if canonical_name and raw_vendor.lower().strip() != vendor_info["name_folded"]:
             # Raw name differs from canonical — LEARN THIS ALIAS
             stored = erp_adapter.store_vendor_alias(
                 alias_name=raw_vendor,
@@ -76,13 +76,10 @@ def approve_invoice(invoice_id: int, db: Session = Depends(get_db)):
                 logger.info(f"[LEARNING] Learning alias: '{raw_vendor}' → '{canonical_name}' (vendor_id={db_invoice.vendor_id})")
                 
                 # Record learning in audit trail
-                if not db_invoice.audit_trail:
-                    db_invoice.audit_trail = []
-                db_invoice.audit_trail.append({
-                    "t": "learned",
-                    "m": f"Learned alias '{raw_vendor}' → '{canonical_name}' for future autonomous matching"
-                })
-                flag_modified(db_invoice, "audit_trail")
+                db_invoice.add_audit(
+                    db, "learned",
+                    f"Learned alias '{raw_vendor}' → '{canonical_name}' for future autonomous matching",
+                )
             else:
                 logger.info(f"[LEARNING] Alias '{raw_vendor}' already known")
         else:
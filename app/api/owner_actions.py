@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, func
-from ..database import SessionLocal
+from sqlalchemy import Integer, case, or_, func, select, text
+from ..database import SessionLocal, get_async_db
 from .. import models, schemas
-from ..services.notifications import send_email_to_supplier, send_sms_to_owner, send_whatsapp_to_owner
+from ..services.notifications import deliver_outbox, notify_in_background
 import datetime
 import logging
+import orjson
 
 logger = logging.getLogger("OwnerActions")
 
@@ -18,6 +20,10 @@ def get_db():
     finally:
         db.close()
 
+def _orjson_response(content) -> Response:
+    """Plain dict/list payload rendered by orjson, skipping jsonable_encoder."""
+    return Response(orjson.dumps(content), media_type="application/json")
+
 
 @router.get("/api/system-state")
 def get_system_state(db: Session = Depends(get_db)):
@@ -35,55 +41,94 @@ def get_system_state(db: Session = Depends(get_db)):
     }
 
 @router.get("/api/inventory")
-def get_inventory(
+async def get_inventory(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     search: str = Query("", description="Search by SKU or product name"),
     category: str = Query("", description="Filter by category"),
     status: str = Query("", description="Filter by status"),
-    db: Session = Depends(get_db),
+    cursor: str = Query("", description="Last SKU of the previous page (keyset pagination)"),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    q = db.query(models.InventoryItem)
-
-    if search:
+    """
+    One page of inventory, ordered by SKU. Pass the previous response's
+    `next_cursor` as `cursor` to page by key instead of OFFSET. When paging
+    by offset, the total comes from a window over the same scan rather than
+    a separate COUNT query (only a page past the end counts separately).
+    Cursor pages return `total: null` — the client keeps the one from the
+    first page — and use the window count only for `has_more`. Rows go
+    straight to orjson (datetimes included) without passing through
+    jsonable_encoder.
+    """
+    Item = models.InventoryItem
+    filters = []
+    if search and models.INVENTORY_FTS and len(search) >= 3:
+        # Index lookup instead of a full-table ILIKE; the term is quoted as
+        # one FTS string so punctuation in SKUs isn't read as query syntax.
+        fts_ids = text(
+            "SELECT rowid FROM inventory_fts WHERE inventory_fts MATCH :m"
+        ).bindparams(m='"' + search.replace('"', '""') + '"').columns(rowid=Integer)
+        filters.append(Item.id.in_(fts_ids))
+    elif search:
         term = f"%{search}%"
-        q = q.filter(or_(
-            models.InventoryItem.sku.ilike(term),
-            models.InventoryItem.product_name.ilike(term),
+        filters.append(or_(
+            Item.sku.ilike(term),
+            Item.product_name.ilike(term),
         ))
     if category:
-        q = q.filter(models.InventoryItem.category == category)
+        filters.append(Item.category == category)
     if status:
-        q = q.filter(models.InventoryItem.status == status)
+        filters.append(Item.status == status)
 
-    total = q.count()
-    items = q.order_by(models.InventoryItem.sku).offset((page - 1) * page_size).limit(page_size).all()
+    # Plain column rows — no ORM objects to build for a read-only page.
+    # COUNT(*) OVER () is taken before LIMIT/OFFSET: the whole filtered set
+    # when paging by offset, everything after the cursor when paging by key.
+    q = select(
+        Item.id, Item.sku, Item.product_name, Item.category, Item.brand, Item.supplier,
+        Item.stock_quantity, Item.reorder_level, Item.cost_price, Item.selling_price,
+        Item.warehouse_location, Item.last_updated, Item.status,
+        func.count().over().label("matched"),
+    ).where(*filters).order_by(Item.sku)
+    if cursor:
+        q = q.where(Item.sku > cursor)
+    else:
+        q = q.offset((page - 1) * page_size)
+    rows = (await db.execute(q.limit(page_size))).all()
+    items = []
+    for row in rows:
+        item = row._asdict()
+        del item["matched"]
+        items.append(item)
 
-    return {
-        "items": [
-            {
-                "id": i.id, "sku": i.sku, "product_name": i.product_name,
-                "category": i.category, "brand": i.brand, "supplier": i.supplier,
-                "stock_quantity": i.stock_quantity, "reorder_level": i.reorder_level,
-                "cost_price": i.cost_price, "selling_price": i.selling_price,
-                "warehouse_location": i.warehouse_location,
-                "last_updated": i.last_updated.isoformat() if i.last_updated else None,
-                "status": i.status,
-            }
-            for i in items
-        ],
+    matched = rows[0].matched if rows else 0
+    if cursor:
+        total = None
+    elif not rows and page > 1:
+        total = (await db.execute(select(func.count()).select_from(Item).where(*filters))).scalar()
+    else:
+        total = matched
+    has_more = matched > len(items) if cursor else total > (page - 1) * page_size + len(items)
+    next_cursor = items[-1]["sku"] if has_more else None
+
+    return _orjson_response({
+        "items": items,
         "total": total,
         "page": page,
         "page_size": page_size,
-    }
+        "next_cursor": next_cursor,
+    })
 
 @router.get("/api/inventory/summary")
-def get_inventory_summary(db: Session = Depends(get_db)):
-    total = db.query(func.count(models.InventoryItem.id)).scalar() or 0
-    low = db.query(func.count(models.InventoryItem.id)).filter(models.InventoryItem.status == "Low Stock").scalar() or 0
-    oos = db.query(func.count(models.InventoryItem.id)).filter(models.InventoryItem.status == "Out of Stock").scalar() or 0
-    total_value = db.query(func.sum(models.InventoryItem.cost_price * models.InventoryItem.stock_quantity)).scalar() or 0
-    return {"total": total, "low_stock": low, "out_of_stock": oos, "total_value": round(total_value, 2)}
+async def get_inventory_summary(db: AsyncSession = Depends(get_async_db)):
+    # All four figures from one pass over the table
+    Item = models.InventoryItem
+    total, low, oos, total_value = (await db.execute(select(
+        func.count(Item.id),
+        func.count(case((Item.status == "Low Stock", 1))),
+        func.count(case((Item.status == "Out of Stock", 1))),
+        func.coalesce(func.sum(Item.cost_price * Item.stock_quantity), 0),
+    ))).one()
+    return _orjson_response({"total": total, "low_stock": low, "out_of_stock": oos, "total_value": round(total_value, 2)})
 
 
 @router.post("/api/owner/approve-refill/{event_id}")
@@ -92,45 +137,19 @@ def approve_refill(event_id: int, db: Session = Depends(get_db)):
     Owner approves a refill request.
     Sends real email to supplier + SMS/WhatsApp to owner.
     """
-    event = db.query(models.Event).filter(models.Event.id == event_id).first()
-    if not event:
+    # Event, item (payload["item_id"]) and supplier in one round-trip
+    row = db.query(models.Event, models.InventoryItem, models.Vendor).outerjoin(
+        models.InventoryItem, models.InventoryItem.id == models.Event.payload["item_id"].as_integer()
+    ).outerjoin(
+        models.Vendor, models.Vendor.id == models.InventoryItem.supplier_id
+    ).filter(models.Event.id == event_id).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Event not found")
-    
-    item_id = event.payload.get("item_id")
-    item = db.query(models.InventoryItem).filter(models.InventoryItem.id == item_id).first()
+    event, item, vendor = row
     
     if item:
-        # Get vendor email
-        vendor = db.query(models.Vendor).filter(models.Vendor.id == item.supplier_id).first()
         vendor_email = vendor.email if vendor else "supplier@example.com"
         
-        # 1. Send real email to supplier via Gmail OAuth
-        try:
-            send_email_to_supplier(vendor_email, item.product_name, item.reorder_quantity)
-            logger.info(f"Supplier email sent to {vendor_email} for {item.product_name}")
-        except Exception as e:
-            logger.error(f"Supplier email failed: {e}")
-        
-        # 2. Send SMS to owner
-        try:
-            sms_msg = f"Procure-IQ: Order placed for {item.reorder_quantity}x {item.product_name} to {vendor_email}"
-            send_sms_to_owner(sms_msg)
-        except Exception as e:
-            logger.warning(f"SMS failed (non-fatal): {e}")
-        
-        # 3. Send WhatsApp to owner
-        try:
-            wa_msg = (
-                f"Procure-IQ Order Confirmed\n\n"
-                f"Item: {item.product_name}\n"
-                f"Quantity: {item.reorder_quantity} units\n"
-                f"Supplier: {vendor_email}\n"
-                f"Status: Order Sent"
-            )
-            send_whatsapp_to_owner(wa_msg)
-        except Exception as e:
-            logger.warning(f"WhatsApp failed (non-fatal): {e}")
-        
         # Update Event
         event.status = "COMPLETED"
         event.processed_at = datetime.datetime.utcnow()
@@ -139,7 +158,23 @@ def approve_refill(event_id: int, db: Session = Depends(get_db)):
         item.last_updated = datetime.datetime.utcnow()
         item.stock_quantity += item.reorder_quantity
         
+        # Supplier email + owner SMS/WhatsApp, recorded with the approval so
+        # they can't be lost between the commit and the sends
+        outbox = models.NotificationOutbox(
+            event_id=event.id,
+            channels=["email", "sms", "whatsapp"],
+            payload={"vendor_email": vendor_email, "product": item.product_name, "qty": item.reorder_quantity},
+            status="PENDING",
+        )
+        db.add(outbox)
+        db.flush()
+        outbox_id = outbox.id
         db.commit()
+
+        # Delivered right away on the background pool; the agent's outbox job
+        # retries anything left PENDING
+        notify_in_background(deliver_outbox, outbox_id)
+        logger.info(f"Supplier email and owner notifications queued for {item.product_name} ({vendor_email})")
         return {"status": "success", "message": f"Order sent to {vendor_email} and inventory updated."}
     
     return {"status": "error", "message": "Item not found"}
@@ -1,6 +1,10 @@
 import os
 import datetime
 import hashlib
+import hmac
+import threading
+
+from cachetools import LRUCache
 
 from fastapi import APIRouter, Request, Depends
 from fastapi.responses import RedirectResponse
@@ -8,6 +12,7 @@ from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 
 from .database import get_db
+from .api.credentials_routes import mark_secrets_verified
 from . import models
 
 templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__), "templates"))
@@ -17,18 +22,44 @@ router = APIRouter(tags=["auth"])
 
 # ─── Helpers ──────────────────────────────────────────────
 
+# scrypt cost: ~16 MB and a few tens of ms per hash
+_SCRYPT_N, _SCRYPT_R, _SCRYPT_P = 2 ** 14, 8, 1
+
+# (stored_hash, HMAC(password)) pairs that already verified, so a burst of
+# logins from the same user doesn't pay the KDF each time. The HMAC key is
+# random per process, so a memory dump can't be brute-forced like a bare hash.
+_verified = LRUCache(maxsize=1024)
+_verified_key = os.urandom(32)
+_verified_lock = threading.Lock()
+
+
 def _hash_password(password: str) -> str:
-    salt = os.urandom(16).hex()
-    hashed = hashlib.sha256((salt + password).encode()).hexdigest()
-    return f"{salt}:{hashed}"
+    salt = os.urandom(16)
+    dk = hashlib.scrypt(password.encode(), salt=salt, n=_SCRYPT_N, r=_SCRYPT_R, p=_SCRYPT_P, dklen=32)
+    return f"scrypt${_SCRYPT_N}${_SCRYPT_R}${_SCRYPT_P}${salt.hex()}${dk.hex()}"
 
 
 def _verify_password(password: str, stored_hash: str) -> bool:
+    key = (stored_hash, hmac.new(_verified_key, password.encode(), hashlib.sha256).digest())
+    with _verified_lock:
+        if key in _verified:
+            return True
     try:
-        salt, hashed = stored_hash.split(":", 1)
-        return hashlib.sha256((salt + password).encode()).hexdigest() == hashed
+        if stored_hash.startswith("scrypt$"):
+            _, n, r, p, salt, hashed = stored_hash.split("$")
+            dk = hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt),
+                                n=int(n), r=int(r), p=int(p), dklen=len(hashed) // 2)
+            ok = hmac.compare_digest(dk, bytes.fromhex(hashed))
+        else:
+            # Legacy "salt:sha256hex" hashes; upgraded on the next successful login
+            salt, hashed = stored_hash.split(":", 1)
+            ok = hmac.compare_digest(hashlib.sha256((salt + password).encode()).digest(), bytes.fromhex(hashed))
     except Exception:
         return False
+    if ok:
+        with _verified_lock:
+            _verified[key] = True
+    return ok
 
 
 # ─── Login ────────────────────────────────────────────────
@@ -54,6 +85,8 @@ async def password_login(request: Request, db: Session = Depends(get_db)):
     if not user.is_active:
         return RedirectResponse("/login?error=account_disabled", status_code=303)
 
+    if not user.password_hash.startswith("scrypt$"):
+        user.password_hash = _hash_password(password)
     user.last_login = datetime.datetime.utcnow()
     db.commit()
 
@@ -66,6 +99,39 @@ async def password_login(request: Request, db: Session = Depends(get_db)):
     return RedirectResponse("/", status_code=303)
 
 
+# ─── Re-auth (unlocks secrets for a few minutes) ──────────
+
+@router.get("/auth/reauth")
+async def reauth_page(request: Request):
+    """Ask the signed-in user for their password again before revealing secrets."""
+    if not request.session.get("user"):
+        return RedirectResponse("/login", status_code=303)
+    return templates.TemplateResponse("login.html", {
+        "request":     request,
+        "reauth_mode": True,
+        "email":       request.session["user"].get("email", ""),
+        "error":       request.query_params.get("error", ""),
+    })
+
+
+@router.post("/auth/reauth")
+async def reauth(request: Request, db: Session = Depends(get_db)):
+    """Verify the session user's password and mark secrets as revealable."""
+    session_user = request.session.get("user")
+    if not session_user:
+        return RedirectResponse("/login", status_code=303)
+
+    form     = await request.form()
+    password = str(form.get("password", ""))
+
+    user = db.query(models.User).filter(models.User.email == session_user.get("email")).first()
+    if not user or not user.password_hash or not user.is_active or not _verify_password(password, user.password_hash):
+        return RedirectResponse("/auth/reauth?error=invalid_credentials", status_code=303)
+
+    mark_secrets_verified(request)
+    return RedirectResponse("/settings", status_code=303)
+
+
 # ─── First-time Setup ─────────────────────────────────────
 
 @router.get("/auth/setup")
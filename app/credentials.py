@@ -15,16 +15,29 @@ Security rules:
 
 import datetime
 import logging
-from typing import Optional
+import threading
+from typing import Iterable, Optional
+from cachetools import TTLCache
 from sqlalchemy.orm import Session
 
 logger = logging.getLogger("Credentials")
 
+# DB values are cached briefly so per-request lookups (auth, AI clients)
+# don't each open a session; set_credential drops the key it writes.
+CREDENTIAL_CACHE_TTL = 30  # seconds
+_cred_cache = TTLCache(maxsize=128, ttl=CREDENTIAL_CACHE_TTL)
+_cred_lock = threading.Lock()
+_MISSING = object()
+
 # Lazy import to avoid circular deps
 def _get_db():
     from .database import SessionLocal
     return SessionLocal()
 
+def _get_read_db():
+    from .database import ReadSessionLocal
+    return ReadSessionLocal()
+
 def _get_settings():
     from config import settings
     return settings
@@ -50,34 +63,66 @@ CREDENTIAL_CATALOGUE = {
 # Core read / write
 # ──────────────────────────────────────────────────────────
 
-def get_credential(key: str, default: Optional[str] = None) -> Optional[str]:
-    """
-    Internal-use only. Returns the raw value of a credential.
-    Priority: DB → .env → default
-    """
-    # 1. Try database
-    try:
+def _db_values(keys: Iterable[str]) -> dict:
+    """DB value per key (None if unset), from the cache or one `key IN (...)` query."""
+    keys = list(keys)
+    with _cred_lock:
+        found = {k: v for k in keys if (v := _cred_cache.get(k, _MISSING)) is not _MISSING}
+    missing = [k for k in keys if k not in found]
+    if missing:
         from . import models
-        db = _get_db()
+        db = _get_read_db()
         try:
-            row = db.query(models.AppSetting).filter(models.AppSetting.key == key).first()
-            if row and row.value and row.value.strip():
-                return row.value.strip()
+            rows = db.query(models.AppSetting.key, models.AppSetting.value).filter(
+                models.AppSetting.key.in_(missing)
+            ).all()
         finally:
             db.close()
-    except Exception as e:
-        logger.warning(f"[CREDS] DB lookup failed for '{key}': {e}")
+        fetched = dict.fromkeys(missing)
+        for key, value in rows:
+            fetched[key] = value.strip() if value and value.strip() else None
+        with _cred_lock:
+            _cred_cache.update(fetched)
+        found.update(fetched)
+    return found
+
 
-    # 2. Fall back to .env / settings
+def _env_value(key: str) -> Optional[str]:
     try:
-        settings = _get_settings()
-        env_val = getattr(settings, key, None)
+        env_val = getattr(_get_settings(), key, None)
         if env_val and str(env_val).strip():
             return str(env_val).strip()
     except Exception:
         pass
+    return None
+
+
+def get_credentials_bulk(keys: Iterable[str], default: Optional[str] = None) -> dict:
+    """
+    Internal-use only. Raw values for several credentials with one DB query.
+    Priority per key: DB → .env → default
+    """
+    keys = list(keys)
+    try:
+        db_vals = _db_values(keys)
+    except Exception as e:
+        logger.warning(f"[CREDS] DB lookup failed for {keys}: {e}")
+        db_vals = {}
+    return {k: db_vals.get(k) or _env_value(k) or default for k in keys}
+
+
+def get_credential(key: str, default: Optional[str] = None) -> Optional[str]:
+    """
+    Internal-use only. Returns the raw value of a credential.
+    Priority: DB → .env → default
+    """
+    return get_credentials_bulk([key], default)[key]
 
-    return default
+
+def invalidate_credential(key: str):
+    """Drop a cached DB value (after it is written outside set_credential)."""
+    with _cred_lock:
+        _cred_cache.pop(key, None)
 
 
 def set_credential(key: str, value: str, db: Session = None) -> bool:
@@ -106,6 +151,7 @@ def set_credential(key: str, value: str, db: Session = None) -> bool:
             )
             db.add(row)
         db.commit()
+        invalidate_credential(key)
         logger.info(f"[CREDS] Updated '{key}' in DB.")
         return True
     except Exception as e:
@@ -139,21 +185,17 @@ def get_all_credentials_masked() -> list[dict]:
     Returns all known credentials with masked values and metadata.
     Safe to return in API responses — no plaintext secrets.
     """
+    # One `key IN (...)` query for the whole catalogue
+    try:
+        db_vals = _db_values(CREDENTIAL_CATALOGUE)
+    except Exception as e:
+        logger.warning(f"[CREDS] DB lookup failed for catalogue: {e}")
+        db_vals = {}
+
     result = []
     for key, (description, is_secret) in CREDENTIAL_CATALOGUE.items():
-        raw = get_credential(key)
-        # Check if it came from DB
-        from_db = False
-        try:
-            from . import models
-            db = _get_db()
-            try:
-                row = db.query(models.AppSetting).filter(models.AppSetting.key == key).first()
-                from_db = bool(row and row.value)
-            finally:
-                db.close()
-        except Exception:
-            pass
+        from_db = bool(db_vals.get(key))
+        raw = db_vals.get(key) or _env_value(key)
 
         result.append({
             "key": key,
@@ -1,33 +1,94 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, raiseload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from . import models, schemas
 import datetime
 
 def get_invoice(db: Session, invoice_id: int):
-    return db.query(models.Invoice).filter(models.Invoice.id == invoice_id).first()
+    # Primary-key lookup: served from the session's identity map when the
+    # invoice is already loaded, otherwise one SELECT with every column
+    return db.get(models.Invoice, invoice_id)
 
-def get_invoices(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Invoice).order_by(models.Invoice.id.desc()).offset(skip).limit(limit).all()
+async def get_invoices(db: AsyncSession, skip: int = 0, limit: int = 100):
+    # History rows for the whole page in one IN query; raiseload turns any
+    # other lazy load during list serialization into an error, not an N+1
+    result = await db.scalars(
+        select(models.Invoice).options(selectinload(models.Invoice.audit_events), raiseload("*")).order_by(models.Invoice.id.desc()).offset(skip).limit(limit)
+    )
+    return result.all()
 
-def create_invoice(db: Session, invoice: schemas.InvoiceCreate):
-    db_invoice = models.Invoice(**invoice.dict())
-    db.add(db_invoice)
+def _insert_returning(db: Session, model, **values):
+    """
+    INSERT ... RETURNING the whole row and commit. The object is detached
+    before the commit so it keeps the returned values (ids, defaults)
+    instead of being expired and re-SELECTed on first access.
+    """
+    obj = db.scalars(insert(model).values(**values).returning(model)).one()
+    db.expunge(obj)
     db.commit()
-    db.refresh(db_invoice)
+    return obj
+
+def create_invoice(db: Session, invoice: schemas.InvoiceCreate):
+    db_invoice = _insert_returning(db, models.Invoice, **invoice.dict())
+    # A new invoice has no history; mark it loaded so audit_log works detached
+    set_committed_value(db_invoice, "audit_events", [])
     return db_invoice
 
 def create_event(db: Session, event_type: str, payload: dict):
-    db_event = models.Event(event_type=event_type, payload=payload, status="PENDING")
-    db.add(db_event)
-    db.commit()
-    db.refresh(db_event)
-    return db_event
+    return _insert_returning(db, models.Event, event_type=event_type, payload=payload, status="PENDING")
 
-def get_pending_events(db: Session):
-    return db.query(models.Event).filter(models.Event.status == "PENDING").all()
+def claim_pending_events(db: Session, after_id: int = 0, batch_size: int = 50) -> list:
+    """
+    Atomically flip up to `batch_size` PENDING events with id > after_id to
+    PROCESSING and return them — one UPDATE ... RETURNING and one commit,
+    so a second worker can never claim the same row.
+    """
+    oldest = (
+        select(models.Event.id)
+        .where(models.Event.status == "PENDING", models.Event.id > after_id)
+        .order_by(models.Event.id)
+        .limit(batch_size)
+    )
+    stmt = (
+        update(models.Event)
+        .where(models.Event.id.in_(oldest.scalar_subquery()), models.Event.status == "PENDING")
+        .values(status="PROCESSING")
+        .returning(models.Event)
+        .execution_options(synchronize_session=False)
+    )
+    events = sorted(db.scalars(stmt).all(), key=lambda e: e.id)
+    db.commit()
+    return events
 
-def mark_event_processed(db: Session, event_id: int):
-    db_event = db.query(models.Event).filter(models.Event.id == event_id).first()
-    if db_event:
-        db_event.status = "COMPLETED"
-        db_event.processed_at = datetime.datetime.utcnow()
-        db.commit()
+def claim_outbox(db: Session, outbox_id: int = None, batch_size: int = 20, lease_s: int = 300) -> list:
+    """
+    Flip due PENDING outbox rows (or just `outbox_id`) to SENDING and return
+    them, bumping `attempts` — the same UPDATE ... RETURNING claim as
+    claim_pending_events, so a row is only ever delivered by one caller.
+    The claim is a lease: `next_attempt_at` moves `lease_s` ahead, and a
+    SENDING row whose lease has run out (its sender crashed) is claimable again.
+    """
+    Outbox = models.NotificationOutbox
+    now = datetime.datetime.utcnow()
+    expired = and_(Outbox.status == "SENDING", Outbox.next_attempt_at <= now)
+    if outbox_id is not None:
+        claimable = or_(Outbox.status == "PENDING", expired)
+        due = select(Outbox.id).where(Outbox.id == outbox_id, claimable)
+    else:
+        claimable = and_(Outbox.status.in_(("PENDING", "SENDING")), Outbox.next_attempt_at <= now)
+        due = select(Outbox.id).where(claimable).order_by(Outbox.id).limit(batch_size)
+    stmt = (
+        update(Outbox)
+        .where(Outbox.id.in_(due.scalar_subquery()), claimable)
+        .values(
+            status="SENDING",
+            attempts=Outbox.attempts + 1,
+            next_attempt_at=now + datetime.timedelta(seconds=lease_s),
+        )
+        .returning(Outbox)
+        .execution_options(synchronize_session=False)
+    )
+    rows = sorted(db.scalars(stmt).all(), key=lambda r: r.id)
+    db.commit()
+    return rows
@@ -1,37 +1,181 @@
-from sqlalchemy import create_engine, event
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.declarative import declarative_base
 import os, sys
+from urllib.parse import quote
+import logging
+import orjson
+from starlette.concurrency import run_in_threadpool
 
 # Import config
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import settings
 
+logger = logging.getLogger("Database")
+
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
 # Configure engine — SQLite needs special args, Postgres does not
-_connect_args = {}
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
-    _connect_args = {"check_same_thread": False, "timeout": 30}
+_is_sqlite = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+_connect_args = {"check_same_thread": False, "timeout": 30} if _is_sqlite else {}
+
+def _json_serializer(value):
+    """JSON columns (audit_trail, extracted_data, payload) via orjson."""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+
+# SQLite file: keep enough pooled connections that request bursts reuse
+# already-configured ones instead of opening (and re-running the pragmas on)
+# short-lived overflow connections. A single shared StaticPool connection
+# would interleave the transactions of concurrent sessions.
+_SQLITE_FILE = _is_sqlite and ":memory:" not in SQLALCHEMY_DATABASE_URL
+_pool_args = {}
+if _SQLITE_FILE:
+    _pool_args = {"pool_size": 10, "max_overflow": 10}
+elif not _is_sqlite:
+    # Postgres: one engine for reads and writes (MVCC, no single-writer lock);
+    # pre_ping drops connections the server or a proxy closed while idle
+    _pool_args = {"pool_size": 20, "max_overflow": 10, "pool_pre_ping": True}
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=_connect_args)
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args=_connect_args,
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads,
+    **_pool_args,
+)
+
+# Applied to every new SQLite connection. WAL lets readers run alongside the
+# single writer; busy_timeout matches the driver's 30s `timeout`.
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "busy_timeout=30000",
+    "cache_size=-65536",   # 64 MiB page cache
+    "temp_store=MEMORY",   # sorts/temp b-trees (inventory ORDER BY) stay off disk
+    "mmap_size=268435456", # read pages through a 256 MiB memory map
+    "wal_autocheckpoint=1000",
+)
 
 # Enable WAL mode ONLY for SQLite (Postgres handles concurrency natively)
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+if _SQLITE_FILE:
     @event.listens_for(engine, "connect")
     def set_sqlite_pragma(dbapi_conn, connection_record):
         """Configure SQLite for optimal concurrent access."""
         cursor = dbapi_conn.cursor()
-        cursor.execute("PRAGMA journal_mode=WAL")
-        cursor.execute("PRAGMA synchronous=NORMAL")
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(f"PRAGMA {pragma}")
+        cursor.close()
+
+# Read-only pool for read paths (GET endpoints, credential lookups). Under WAL
+# these connections never take the write lock, so they don't queue behind the
+# agent's commits. Other databases read through the main engine.
+if _SQLITE_FILE:
+    _db_path = quote(os.path.abspath(engine.url.database))
+    read_engine = create_engine(
+        f"sqlite:///file:{_db_path}?mode=ro&uri=true",
+        connect_args=_connect_args,
+        pool_size=8,
+        max_overflow=8,
+        json_serializer=_json_serializer,
+        json_deserializer=orjson.loads,
+    )
+
+    @event.listens_for(read_engine, "connect")
+    def set_sqlite_read_pragma(dbapi_conn, connection_record):
+        """Per-connection tuning for readers (journal mode is the writer's job)."""
+        cursor = dbapi_conn.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            if not pragma.startswith(("journal_mode", "synchronous")):
+                cursor.execute(f"PRAGMA {pragma}")
+        cursor.close()
+else:
+    read_engine = engine
+
+# Async engine for `async def` routes: they await the database instead of
+# holding a threadpool worker per query. The agent and scripts stay sync.
+_ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg", "mysql": "aiomysql"}
+
+def _async_url(url: str):
+    """Same database through its async driver, or None if there is none."""
+    parsed = make_url(url)
+    driver = _ASYNC_DRIVERS.get(parsed.get_backend_name())
+    return parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}") if driver else None
+
+async_engine = None
+try:
+    _url = _async_url(SQLALCHEMY_DATABASE_URL)
+    if _url is None:
+        logger.info("No async driver for this database; async routes use the sync engine")
+    else:
+        async_engine = create_async_engine(
+            _url,
+            connect_args=_connect_args,
+            json_serializer=_json_serializer,
+            json_deserializer=orjson.loads,
+            **_pool_args,
+        )
+except Exception as e:  # async driver not installed
+    logger.warning(f"Async engine unavailable, async routes use the sync engine: {e}")
+
+if _SQLITE_FILE and async_engine is not None:
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def set_sqlite_async_pragma(dbapi_conn, connection_record):
+        """Same per-connection tuning as the sync writer."""
+        cursor = dbapi_conn.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(f"PRAGMA {pragma}")
         cursor.close()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+# Agent loop: a fresh session per cycle, so objects it just wrote stay loaded
+# across its commits instead of being re-SELECTed on next access.
+AgentSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession)
+    if async_engine is not None else None
+)
 Base = declarative_base()
 
 def get_db():
+    """Read-write session (the default for routes that change data)."""
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+def get_db_read():
+    """Read-only session for routes that only query."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+class _ThreadedSession:
+    """
+    Stand-in for AsyncSession when there is no async driver: runs a sync
+    Session's execute/scalars in the threadpool and returns buffered results.
+    """
+    def __init__(self, db: Session):
+        self._db = db
+
+    async def execute(self, statement, *args, **kwargs):
+        return await run_in_threadpool(lambda: self._db.execute(statement, *args, **kwargs).freeze()())
+
+    async def scalars(self, statement, *args, **kwargs):
+        return (await self.execute(statement, *args, **kwargs)).scalars()
+
+async def get_async_db():
+    """Async session for `async def` routes."""
+    if AsyncSessionLocal is None:
+        db = SessionLocal()
+        try:
+            yield _ThreadedSession(db)
+        finally:
+            await run_in_threadpool(db.close)
+        return
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -20,22 +20,26 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.database import engine, SessionLocal
 from app import models
+from sqlalchemy import exists, func, insert, select
 import datetime
 
 
+def _has_rows(db, model) -> bool:
+    """EXISTS probe — stops at the first row instead of counting them all."""
+    return db.query(exists().select_from(model)).scalar()
+
+
 def seed_erp_data(db):
-    """Seed Python ERP DB with realistic data for demo."""
+    """Seed Python ERP DB with realistic data for demo. The caller commits."""
     
     # Skip if already seeded
-    if db.query(models.GoodsReceipt).count() > 0:
+    if _has_rows(db, models.GoodsReceipt):
         print("[SKIP] ERP data already seeded")
         return
     
     print("\nSeeding ERP data (vendors, POs, receipts)...")
     
     # --- Ensure we have enough vendors (add more if needed) ---
-    existing_count = db.query(models.Vendor).count()
-    
     erp_vendors = [
         models.Vendor(name="TCS Limited", email="procurement@tcs.com", active=True),
         models.Vendor(name="Infosys Technologies", email="vendor@infosys.com", active=True),
@@ -50,8 +54,8 @@ def seed_erp_data(db):
         models.Vendor(name="Coforge Limited", email="billing@coforge.com", active=True),
         models.Vendor(name="Zensar Technologies", email="vendor@zensar.com", active=True),
     ]
-    db.add_all(erp_vendors)
-    db.commit()
+    # Ids are re-read below, so no need to fetch them per row
+    db.bulk_save_objects(erp_vendors)
     print(f"  [OK] Added {len(erp_vendors)} ERP vendors")
     
     # --- Get all vendor IDs for PO creation ---
@@ -59,7 +63,6 @@ def seed_erp_data(db):
     vendor_ids = [v.id for v in all_vendors]
     
     # --- Purchase Orders ---
-    pos = []
     po_data = [
         ("PO-2024-1001", vendor_ids[0 % len(vendor_ids)], 150000.00, 100, 1500.00, "confirmed_by_owner"),
         ("PO-2024-1002", vendor_ids[1 % len(vendor_ids)], 85000.00, 50, 1700.00, "confirmed_by_owner"),
@@ -83,43 +86,46 @@ def seed_erp_data(db):
         ("PO-2024-1020", vendor_ids[7 % len(vendor_ids)], 245000.00, 180, 1361.11, "confirmed_by_owner"),
     ]
     
-    for i, (po_num, vid, total, qty, unit_p, status) in enumerate(po_data):
-        po = models.PurchaseOrder(
-            po_number=po_num,
-            vendor_id=vid,
-            item_id=1,  # Reference first inventory item
-            quantity=qty,
-            unit_price=unit_p,
-            total_amount=total,
-            status=status,
-            approved_by_owner=True,
-            created_at=datetime.datetime(2024, 1, 10 + i),
-        )
-        pos.append(po)
-    
-    db.add_all(pos)
-    db.commit()
-    print(f"  [OK] Created {len(pos)} purchase orders")
+    # Core executemany: plain row dicts, no ORM objects for seed data
+    po_rows = [
+        {
+            "po_number": po_num,
+            "vendor_id": vid,
+            "item_id": 1,  # Reference first inventory item
+            "quantity": qty,
+            "unit_price": unit_p,
+            "total_amount": total,
+            "status": status,
+            "approved_by_owner": True,
+            "created_at": datetime.datetime(2024, 1, 10 + i),
+        }
+        for i, (po_num, vid, total, qty, unit_p, status) in enumerate(po_data)
+    ]
+    db.execute(insert(models.PurchaseOrder), po_rows)
+    print(f"  [OK] Created {len(po_rows)} purchase orders")
     
     # --- Goods Receipts (for confirmed POs) ---
-    receipts = []
-    for po in pos:
-        if po.status == "confirmed_by_owner":
-            receipt = models.GoodsReceipt(
-                purchase_order_id=po.id,
-                received_date=po.created_at + datetime.timedelta(days=5),
-                received_quantity=po.quantity,
-                received_amount=po.total_amount,
-                notes=f"Full delivery for {po.po_number}",
-            )
-            receipts.append(receipt)
-    
-    db.add_all(receipts)
-    db.commit()
+    PO = models.PurchaseOrder
+    confirmed = db.execute(
+        select(PO.id, PO.created_at, PO.total_amount, PO.quantity, PO.po_number)
+        .where(PO.status == "confirmed_by_owner", PO.po_number.in_([row[0] for row in po_data]))
+        .order_by(PO.id)
+    ).all()
+    receipts = [
+        {
+            "purchase_order_id": po.id,
+            "received_date": po.created_at + datetime.timedelta(days=5),
+            "received_quantity": po.quantity,
+            "received_amount": po.total_amount,
+            "notes": f"Full delivery for {po.po_number}",
+        }
+        for po in confirmed
+    ]
+    db.execute(insert(models.GoodsReceipt), receipts)
     print(f"  [OK] Created {len(receipts)} goods receipts")
     
     # --- Default ERP Connection ---
-    if db.query(models.ERPConnection).count() == 0:
+    if not _has_rows(db, models.ERPConnection):
         default_conn = models.ERPConnection(
             connection_name="Python Sample DB",
             erp_type="python_db",
@@ -128,7 +134,6 @@ def seed_erp_data(db):
             last_tested=datetime.datetime.utcnow(),
         )
         db.add(default_conn)
-        db.commit()
         print("  [OK] Created default ERP connection (Python Sample DB)")
 
 
@@ -136,18 +141,19 @@ def init_database():
     """Create all tables and seed sample data."""
     
     print("Creating database tables...")
-    models.Base.metadata.create_all(bind=engine)
+    models.create_missing_tables(engine)
+    models.ensure_indexes(engine)
     print("[OK] Tables created")
     
     db = SessionLocal()
     
     try:
         # Check if data already exists
-        existing_vendors = db.query(models.Vendor).count()
-        if existing_vendors > 0:
-            print(f"Database already has {existing_vendors} vendors. Skipping base seed data.")
+        if _has_rows(db, models.Vendor):
+            print("Database already has vendors. Skipping base seed data.")
             # Still try to seed ERP data
             seed_erp_data(db)
+            db.commit()
             return
         
         print("\nSeeding sample data...")
@@ -159,10 +165,10 @@ def init_database():
             models.Vendor(id=3, name="Gamma Industrial", email="info@gammaindustrial.com", active=True),
         ]
         
-        for vendor in vendors:
-            db.add(vendor)
-        
-        db.commit()
+        # bulk_save_objects: one executemany INSERT per table. add_all would
+        # insert row by row to fetch each generated primary key, which
+        # nothing here reads back.
+        db.bulk_save_objects(vendors)
         print(f"[OK] Created {len(vendors)} vendors")
         
         # 2. Create vendor aliases
@@ -172,10 +178,7 @@ def init_database():
             models.VendorAlias(alias_name="Beta Supplies", vendor_id=2, confidence=90),
         ]
         
-        for alias in aliases:
-            db.add(alias)
-        
-        db.commit()
+        db.bulk_save_objects(aliases)
         print(f"[OK] Created {len(aliases)} vendor aliases")
         
         # 3. Create sample inventory items (20 items, some with low stock)
@@ -207,10 +210,7 @@ def init_database():
             models.InventoryItem(name="IC Chip T", quantity=55, reorder_threshold=20, reorder_quantity=70, supplier_id=2, unit_price=12.00, sku="ICP-T-020"),
         ]
         
-        for item in inventory_items:
-            db.add(item)
-        
-        db.commit()
+        db.bulk_save_objects(inventory_items)
         print(f"[OK] Created {len(inventory_items)} inventory items")
         
         # Count low stock items
@@ -220,15 +220,25 @@ def init_database():
         # 4. Seed ERP data (vendors, POs, receipts, default connection)
         seed_erp_data(db)
         
+        # Everything above is one transaction: a single commit (one WAL
+        # sync), and a failure part-way leaves the database unseeded
+        db.commit()
+        
+        # All four table counts in one round-trip
+        n_vendors, n_pos, n_receipts, n_connections = db.execute(select(*(
+            select(func.count()).select_from(model).scalar_subquery()
+            for model in (models.Vendor, models.PurchaseOrder, models.GoodsReceipt, models.ERPConnection)
+        ))).one()
+        
         print("\n[SUCCESS] Database initialization complete!")
         print(f"\nSummary:")
-        print(f"  - Vendors: {db.query(models.Vendor).count()}")
+        print(f"  - Vendors: {n_vendors}")
         print(f"  - Vendor Aliases: {len(aliases)}")
         print(f"  - Inventory Items: {len(inventory_items)}")
         print(f"  - Low Stock Items: {low_stock_count}")
-        print(f"  - Purchase Orders: {db.query(models.PurchaseOrder).count()}")
-        print(f"  - Goods Receipts: {db.query(models.GoodsReceipt).count()}")
-        print(f"  - ERP Connections: {db.query(models.ERPConnection).count()}")
+        print(f"  - Purchase Orders: {n_pos}")
+        print(f"  - Goods Receipts: {n_receipts}")
+        print(f"  - ERP Connections: {n_connections}")
         
     except Exception as e:
         print(f"\n[ERROR] Error during initialization: {e}")
@@ -107,6 +107,15 @@ async def lifespan(app):
     except Exception as e:
         print(f"[STARTUP] Admin seed failed (non-fatal): {e}")
 
+    # 0b. Pre-open AI provider connections (DNS/TCP/TLS) — non-fatal
+    try:
+        from .agent.ai_client import get_ai_client
+        from .agent.bg_loop import run_async
+        # On the agent's loop, which owns the connections the matcher reuses
+        await run_async(get_ai_client().warmup())
+    except Exception as e:
+        print(f"[STARTUP] AI warmup failed (non-fatal): {e}")
+
     # 1. Start Gmail Invoice Agent (Async) — non-fatal
     try:
         asyncio.create_task(
@@ -125,6 +134,14 @@ async def lifespan(app):
 
     yield
 
+    # Shutdown: release the AI client's pooled keep-alive connections
+    try:
+        from .agent.ai_client import close_ai_client
+        from .agent.bg_loop import run_async
+        await run_async(close_ai_client())
+    except Exception as e:
+        print(f"[SHUTDOWN] AI client close failed (non-fatal): {e}")
+
 # --- App Initialization ---
 app = FastAPI(
     title="Procure-IQ API",
@@ -159,7 +176,16 @@ app.add_middleware(
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 STATIC_DIR = os.path.join(BASE_DIR, "static")
 os.makedirs(STATIC_DIR, exist_ok=True)
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+
+class CachedStaticFiles(StaticFiles):
+    """Static files; requests carrying a ?v= version are cacheable for a year."""
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code == 200 and b"v=" in scope.get("query_string", b""):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+app.mount("/static", CachedStaticFiles(directory=STATIC_DIR), name="static")
 templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
 
 # --- Authentication Dependencies ---
@@ -315,15 +341,13 @@ def update_gmail_invoice_status(invoice_id: int, body: dict, db: Session = Depen
         raise HTTPException(status_code=400, detail="status must be APPROVED or REJECTED")
     inv.status = new_status
     # Write audit trail entry
-    trail = list(inv.audit_trail or [])
-    trail.append({
+    if inv.audit_trail is None:
+        inv.audit_trail = []
+    inv.audit_trail.append({
         "t": datetime.datetime.utcnow().isoformat(),
         "a": new_status.lower(),
         "m": f"Manually marked {new_status} via dashboard"
     })
-    inv.audit_trail = trail
-    from sqlalchemy.orm.attributes import flag_modified
-    flag_modified(inv, "audit_trail")
     db.commit()
     return {"success": True, "id": invoice_id, "status": inv.status}
 
@@ -439,7 +463,8 @@ def get_analytics(db: Session = Depends(get_db)):
 
 # --- Database & Security ---
 try:
-    models.Base.metadata.create_all(bind=engine)
+    models.create_missing_tables(engine)
+    models.ensure_indexes(engine)
     print("[STARTUP] Database tables created successfully")
 except Exception as e:
     print(f"[STARTUP] WARNING: Database connection failed: {e}")
@@ -460,8 +485,9 @@ if not settings.API_KEY:
 async def ai_health_check():
     """AI health and metrics."""
     from .agent.ai_client import get_ai_client
+    from .agent.bg_loop import run_async
     client = get_ai_client()
-    health = await client.health_check()
+    health = await run_async(client.health_check())
     return {
         "status": "ok",
         "services": health,
@@ -482,7 +508,7 @@ async def ai_status():
         provider = "Gemini 2.0 Flash"
         detail = "OpenRouter API"
         status = "active"
-    elif hasattr(client, 'gemini_model') and client.gemini_model:
+    elif getattr(client, 'gemini_client', None) or getattr(client, 'gemini_model', None):
         provider = "Gemini (Direct)"
         detail = "Google AI SDK"
         status = "active"
@@ -537,6 +563,7 @@ from .init_db import seed_erp_data
 try:
     _db = SessionLocal()
     seed_erp_data(_db)
+    _db.commit()
     _db.close()
 except Exception as e:
     print(f"[WARN] ERP seed: {e}")
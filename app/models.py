@@ -1,7 +1,12 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, JSON, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, JSON, Text, Index, LargeBinary, case, func, inspect, select, update
 from sqlalchemy.orm import relationship
+from sqlalchemy.ext.mutable import MutableList
+from sqlalchemy.schema import CreateIndex
 from .database import Base
 import datetime
+import logging
+
+logger = logging.getLogger("Models")
 
 class User(Base):
     """
@@ -47,6 +52,11 @@ class VendorAlias(Base):
     confidence = Column(Integer, default=100)
     learned_from_invoice_id = Column(Integer, index=True)
 
+    __table_args__ = (
+        # Case-insensitive alias lookups (WHERE lower(alias_name) = ...)
+        Index("ix_vendor_aliases_alias_name_lower", func.lower(alias_name)),
+    )
+
 class Invoice(Base):
     __tablename__ = "invoices"
     id = Column(Integer, primary_key=True, index=True)
@@ -60,7 +70,39 @@ class Invoice(Base):
     confidence_score = Column(Integer, nullable=True)
     reasoning_note = Column(Text, nullable=True)
     is_suspicious = Column(Boolean, default=False)
-    audit_trail = Column(JSON, default=[]) # List of events related to this invoice
+    audit_trail = Column(MutableList.as_mutable(JSON), default=list) # Legacy history; new entries go to audit_events
+    audit_events = relationship("InvoiceAuditEvent", back_populates="invoice", order_by="InvoiceAuditEvent.id")
+
+    @property
+    def audit_log(self) -> list:
+        """Full history: legacy JSON entries, then the append-only rows."""
+        return list(self.audit_trail or []) + [e.as_entry() for e in self.audit_events]
+
+    def add_audit(self, db, t: str, m: str = None, **details):
+        """Record one history entry as its own row (no rewrite of earlier entries)."""
+        db.add(InvoiceAuditEvent(invoice=self, type=t, message=m, details=details or None))
+
+class InvoiceAuditEvent(Base):
+    """
+    Append-only invoice history. One INSERT per entry instead of rewriting
+    the whole audit_trail JSON each time something happens.
+    """
+    __tablename__ = "invoice_audit_events"
+    id = Column(Integer, primary_key=True)
+    invoice_id = Column(Integer, ForeignKey("invoices.id"), index=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    type = Column(String)
+    message = Column(Text, nullable=True)
+    details = Column(JSON, nullable=True)  # extra keys (score, note, old_status, ...)
+    invoice = relationship("Invoice", back_populates="audit_events")
+
+    def as_entry(self) -> dict:
+        """Same {t, m, ...} shape as the legacy audit_trail entries."""
+        entry = {"t": self.type}
+        if self.message is not None:
+            entry["m"] = self.message
+        entry.update(self.details or {})
+        return entry
 
 class ApprovalToken(Base):
     """
@@ -115,11 +157,52 @@ class Event(Base):
     __tablename__ = "events"
     id = Column(Integer, primary_key=True, index=True)
     event_type = Column(String, index=True) # INVOICE_RECEIVED, VENDOR_LEARNED, STOCK_CHECK, SMS_APPROVED
+    # Kept as JSON (orjson-encoded, see database.py): the stock scan reads
+    # payload["item_id"] in SQL, and email bodies live in EventBlob, so the
+    # remaining payloads are a few hundred bytes.
     payload = Column(JSON)
     status = Column(String, default="PENDING") # PENDING, PROCESSING, COMPLETED, FAILED
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     processed_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        # Agent poll: only PENDING rows are indexed, so the claim query stays
+        # proportional to the backlog rather than the table.
+        Index(
+            "idx_events_status_pending", "id",
+            sqlite_where=status == "PENDING", postgresql_where=status == "PENDING",
+        ),
+    )
+
+class EventBlob(Base):
+    """
+    Raw email body for an INVOICE_RECEIVED event, kept out of `events` so the
+    PENDING scan only reads compact rows. The matcher loads it on demand.
+    """
+    __tablename__ = "event_blob"
+    event_id = Column(Integer, ForeignKey("events.id", ondelete="CASCADE"), primary_key=True)
+    body = Column(LargeBinary)
+
+class NotificationOutbox(Base):
+    """
+    Notifications owed for one approval, written in the same transaction as
+    the approval itself. A single delivery claims the row and sends every
+    channel in `channels`; channels that fail stay listed for the retry.
+    """
+    __tablename__ = "notification_outbox"
+    id = Column(Integer, primary_key=True)
+    event_id = Column(Integer, ForeignKey("events.id", ondelete="CASCADE"), nullable=True)
+    channels = Column(JSON)  # ["email", "sms", "whatsapp"]
+    payload = Column(JSON)   # {vendor_email, product, qty}
+    status = Column(String, default="PENDING")  # PENDING, SENDING, SENT, FAILED
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        Index("idx_notification_outbox_due", "status", "next_attempt_at"),
+    )
+
 class InventoryItem(Base):
     """
     ERP-style inventory items with full stock tracking and reorder management.
@@ -131,7 +214,7 @@ class InventoryItem(Base):
     category = Column(String, index=True, nullable=True)
     brand = Column(String, nullable=True)
     supplier = Column(String, nullable=True)
-    supplier_id = Column(Integer, ForeignKey("vendors.id"), nullable=True)
+    supplier_id = Column(Integer, ForeignKey("vendors.id"), nullable=True, index=True)
     stock_quantity = Column(Integer, default=0)
     reorder_level = Column(Integer, default=10)
     reorder_quantity = Column(Integer, default=50)
@@ -141,6 +224,11 @@ class InventoryItem(Base):
     last_updated = Column(DateTime, default=datetime.datetime.utcnow)
     status = Column(String, default="In Stock")  # In Stock / Low Stock / Out of Stock
 
+    __table_args__ = (
+        # Inventory page: filter by status/category, page in SKU order
+        Index("ix_inventory_status_category_sku", "status", "category", "sku"),
+    )
+
     # Backward-compatible aliases for existing agent code
     @property
     def name(self):
@@ -254,6 +342,11 @@ class PurchaseOrder(Base):
     email_sent_at = Column(DateTime, nullable=True)
     expected_delivery_date = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        # Three-way match: PO for a vendor within a cent of the invoice amount
+        Index("ix_purchase_orders_vendor_amount", vendor_id, total_amount),
+    )
+
 class GoodsReceipt(Base):
     """
     Goods receipts for three-way match verification.
@@ -286,6 +379,16 @@ class ERPConnection(Base):
     test_status = Column(String, default='untested')  # 'success', 'failed', 'untested'
     test_error = Column(Text, nullable=True)
 
+    __table_args__ = (
+        # save_connection upserts on the name and relies on the partial index
+        # to keep a single active row without scanning the table.
+        Index("uq_erp_connections_name", "connection_name", unique=True),
+        Index(
+            "uq_erp_connections_active", "is_active", unique=True,
+            sqlite_where=is_active.is_(True), postgresql_where=is_active.is_(True),
+        ),
+    )
+
 
 class GmailInvoice(Base):
     """
@@ -305,7 +408,7 @@ class GmailInvoice(Base):
     received_at    = Column(DateTime, default=datetime.datetime.utcnow)
     found_in_spam  = Column(Boolean, default=False)
     status         = Column(String, default="PENDING_REVIEW")  # PENDING_REVIEW / APPROVED / REJECTED
-    audit_trail    = Column(JSON, default=list)                # [{t, a, m}] action log
+    audit_trail    = Column(MutableList.as_mutable(JSON), default=list)  # [{t, a, m}] action log
     created_at     = Column(DateTime, default=datetime.datetime.utcnow)
 
 
@@ -321,3 +424,120 @@ class SystemState(Base):
     current_mode = Column(String, default="DEBATE")   # DEBATE, CRISIS, SAFE
     severity_score = Column(Integer, default=0)        # 0–10
     last_updated = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+def create_missing_tables(bind):
+    """
+    create_all() only when some mapped table is missing. create_all checks
+    every table one by one; a single table-name listing covers the usual
+    startup where they all exist.
+    """
+    existing = set(inspect(bind).get_table_names())
+    if not set(Base.metadata.tables) <= existing:
+        Base.metadata.create_all(bind=bind)
+
+
+def _dedupe_erp_connections(conn):
+    """
+    Make existing rows fit ERPConnection's unique indexes before they are
+    built, without dropping any: extra rows sharing a name are renamed to
+    "<name> (id N)" (the active one, else the newest, keeps the name), and
+    only the newest active row stays active.
+    """
+    Conn = ERPConnection.__table__.c
+    groups = conn.execute(
+        select(Conn.connection_name, func.max(case((Conn.is_active.is_(True), Conn.id))), func.max(Conn.id))
+        .where(Conn.connection_name.is_not(None))
+        .group_by(Conn.connection_name)
+        .having(func.count() > 1)
+    ).all()
+    for name, active_id, newest_id in groups:
+        keep = active_id or newest_id
+        dup_ids = conn.execute(
+            select(Conn.id).where(Conn.connection_name == name, Conn.id != keep)
+        ).scalars().all()
+        for dup_id in dup_ids:
+            conn.execute(
+                update(ERPConnection.__table__)
+                .where(Conn.id == dup_id)
+                .values(connection_name=f"{name} (id {dup_id})")
+            )
+        logger.warning(f"Renamed {len(dup_ids)} duplicate ERP connection(s) named '{name}' (kept id={keep})")
+
+    newest_active = conn.execute(select(func.max(Conn.id)).where(Conn.is_active.is_(True))).scalar()
+    if newest_active is not None:
+        deactivated = conn.execute(
+            update(ERPConnection.__table__)
+            .where(Conn.is_active.is_(True), Conn.id != newest_active)
+            .values(is_active=False)
+        ).rowcount
+        if deactivated:
+            logger.warning(f"Deactivated {deactivated} extra active ERP connection(s) (kept id={newest_active})")
+
+
+def ensure_indexes(bind):
+    """
+    Create any declared index that is missing. create_all() only builds
+    indexes together with a new table, so databases created before an
+    index was added to a model need this to pick it up.
+    """
+    insp = inspect(bind)
+    if insp.has_table(ERPConnection.__tablename__):
+        existing = {i["name"] for i in insp.get_indexes(ERPConnection.__tablename__)}
+        if not {"uq_erp_connections_name", "uq_erp_connections_active"} <= existing:
+            with bind.begin() as conn:
+                _dedupe_erp_connections(conn)
+
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                with bind.begin() as conn:
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+            except Exception as e:
+                # e.g. a unique index over rows that already hold duplicates
+                logger.warning(f"Could not create index {index.name}: {e}")
+    if bind.dialect.name == "sqlite":
+        ensure_inventory_search(bind)
+
+
+# Set once the FTS5 index below exists; get_inventory falls back to ILIKE
+# (full scan) until then and on other databases.
+INVENTORY_FTS = False
+
+_INVENTORY_FTS_DDL = (
+    # trigram tokenizer: MATCH finds substrings case-insensitively, the same
+    # results as the `%term%` ILIKE it replaces (for terms of 3+ characters).
+    """CREATE VIRTUAL TABLE IF NOT EXISTS inventory_fts USING fts5(
+        sku, product_name, content='inventory', content_rowid='id', tokenize='trigram')""",
+    """CREATE TRIGGER IF NOT EXISTS inventory_fts_ai AFTER INSERT ON inventory BEGIN
+        INSERT INTO inventory_fts(rowid, sku, product_name) VALUES (new.id, new.sku, new.product_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS inventory_fts_ad AFTER DELETE ON inventory BEGIN
+        INSERT INTO inventory_fts(inventory_fts, rowid, sku, product_name) VALUES ('delete', old.id, old.sku, old.product_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS inventory_fts_au AFTER UPDATE OF sku, product_name ON inventory BEGIN
+        INSERT INTO inventory_fts(inventory_fts, rowid, sku, product_name) VALUES ('delete', old.id, old.sku, old.product_name);
+        INSERT INTO inventory_fts(rowid, sku, product_name) VALUES (new.id, new.sku, new.product_name);
+    END""",
+)
+
+
+def ensure_inventory_search(bind):
+    """
+    SQLite only: full-text index over inventory sku/product_name, kept in
+    sync by triggers. Built from existing rows the first time it is created.
+    """
+    global INVENTORY_FTS
+    try:
+        with bind.begin() as conn:
+            exists = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE name = 'inventory_fts'"
+            ).first()
+            for ddl in _INVENTORY_FTS_DDL:
+                conn.exec_driver_sql(ddl)
+            if not exists:
+                conn.exec_driver_sql("INSERT INTO inventory_fts(inventory_fts) VALUES ('rebuild')")
+        INVENTORY_FTS = True
+    except Exception as e:
+        # e.g. SQLite built without FTS5 / older than 3.34 (no trigram)
+        logger.warning(f"Inventory search index unavailable: {e}")
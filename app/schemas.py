@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import AliasChoices, BaseModel, Field
 from typing import Optional, List, Any
 from datetime import datetime
 
@@ -30,7 +30,8 @@ class Invoice(InvoiceBase):
     reasoning_note: Optional[str] = None
     is_suspicious: bool = False
     extracted_data: dict = {}
-    audit_trail: List[dict] = []
+    # Legacy JSON entries + InvoiceAuditEvent rows (models.Invoice.audit_log)
+    audit_trail: List[dict] = Field(default=[], validation_alias=AliasChoices("audit_log", "audit_trail"))
 
     class Config:
         from_attributes = True
@@ -17,7 +17,7 @@ Usage:
 """
 
 import re
-import json
+import orjson
 import logging
 import io
 from typing import Optional
@@ -299,14 +299,14 @@ def _parse_llm_json(raw: str) -> Optional[dict]:
     if text.startswith("```"):
         text = re.sub(r"^```[a-z]*\s*|\s*```$", "", text, flags=re.DOTALL).strip()
     try:
-        return json.loads(text)
-    except json.JSONDecodeError:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
         # Try to find a {...} block inside the text
         m = re.search(r"\{.*\}", text, re.DOTALL)
         if m:
             try:
-                return json.loads(m.group())
-            except json.JSONDecodeError:
+                return orjson.loads(m.group())
+            except orjson.JSONDecodeError:
                 pass
     return None
 
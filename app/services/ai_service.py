@@ -8,10 +8,26 @@ The analyze_invoice_with_ai function provides a robust interface for
 vendor matching and data extraction using cloud LLMs.
 """
 
-import json
 import re
+
+import orjson
+
 from ..agent.ai_client import get_ai_client
 
+# Structured-output schema for the vendor match response
+INVOICE_MATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "best_match_id": {"type": ["integer", "null"]},
+        "extracted_vendor": {"type": "string"},
+        "extracted_amount": {"type": "number"},
+        "confidence": {"type": "number"},
+        "reasoning": {"type": "string"},
+    },
+    "required": ["best_match_id", "extracted_vendor", "extracted_amount", "confidence", "reasoning"],
+    "additionalProperties": False,
+}
+
 
 async def analyze_invoice_with_ai(raw_vendor: str, amount: float, vendors: list, raw_text: str = None):
     """
@@ -42,27 +58,31 @@ async def analyze_invoice_with_ai(raw_vendor: str, amount: float, vendors: list,
     if raw_text:
         context = f"\nRAW EMAIL CONTENT:\n{raw_text}\n"
 
+    # Stable text first (instructions, then the vendor list), per-invoice data
+    # last — providers cache the shared prefix across calls.
     prompt = f"""
-    You are an autonomous procurement agent.
-    Task: Match the raw vendor name '{raw_vendor}' to one of these known vendors:
+    KNOWN VENDORS:
     {vendor_str}
-    
+
+    INVOICE:
+    Raw vendor name: '{raw_vendor}'
     Initial Invoice Amount: {amount}
     {context}
-    
+    """
+
+    system_instruction = """You are a procurement AI assistant specializing in invoice analysis and vendor matching.
+    Task: Match the invoice's raw vendor name to one of the KNOWN VENDORS.
+
     If raw email content is provided, please verify or extract the CORRECT vendor name and total amount from the text.
-    
+
     Return ONLY a JSON object in this format:
-    {{
+    {
       "best_match_id": int or null,
       "extracted_vendor": "string",
       "extracted_amount": float,
       "confidence": 0-100,
       "reasoning": "string"
-    }}
-    """
-    
-    system_instruction = """You are a procurement AI assistant specializing in invoice analysis and vendor matching. 
+    }
     Always return valid JSON with no markdown fences or explanations."""
     
     try:
@@ -71,9 +91,9 @@ async def analyze_invoice_with_ai(raw_vendor: str, amount: float, vendors: list,
         response = await client.complete(
             prompt=prompt,
             system=system_instruction,
-            json_mode=True,
-            temperature=0.3,  # Lower temperature for more deterministic matching
-            max_tokens=500
+            json_schema=INVOICE_MATCH_SCHEMA,
+            temperature=0.1,  # Deterministic matching — and cacheable (<= CACHE_MAX_TEMPERATURE)
+            profile="extract"
         )
         
         # Log the response for debugging
@@ -85,20 +105,24 @@ async def analyze_invoice_with_ai(raw_vendor: str, amount: float, vendors: list,
             print(f"[FALLBACK USED]")
         print(f"-----------------------------------\n")
         
+        # Structured output already parsed by the client
+        if isinstance(response.data, dict):
+            return response.data
+
         # Parse the JSON response
         # Try direct JSON parse first
         try:
-            return json.loads(response.content)
-        except json.JSONDecodeError:
+            return orjson.loads(response.content)
+        except orjson.JSONDecodeError:
             # Fallback: extract JSON from markdown fences or text
             match = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", response.content, re.DOTALL)
             if match:
-                return json.loads(match.group(1))
+                return orjson.loads(match.group(1))
             
             # Try to find any JSON object in the response
             match = re.search(r"(\{.*?\})", response.content, re.DOTALL)
             if match:
-                return json.loads(match.group(1))
+                return orjson.loads(match.group(1))
             
             # If all parsing fails, return error
             raise ValueError("Could not extract valid JSON from AI response")
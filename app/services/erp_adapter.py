@@ -11,11 +11,18 @@ Flow: Agent → ERPAdapter → ERPClient (PythonERP / SAP / NetSuite)
 from .python_erp import PythonERPClient
 from ..database import SessionLocal
 from .. import models
+from cachetools import TTLCache
 import logging
 import datetime
+import threading
 
 logger = logging.getLogger("ERPAdapter")
 
+# Vendor lists change on human timescales — share one fetch across a burst of invoices
+VENDOR_CACHE_TTL = 120
+# Single-vendor lookups (canonical name on approval) — names practically never change
+VENDOR_BY_ID_CACHE_TTL = 300
+
 
 class ERPAdapter:
     """
@@ -29,6 +36,9 @@ class ERPAdapter:
 
     def __init__(self):
         self.client = self._get_active_client()
+        self._vendor_cache = TTLCache(maxsize=1, ttl=VENDOR_CACHE_TTL)
+        self._vendor_by_id = TTLCache(maxsize=2048, ttl=VENDOR_BY_ID_CACHE_TTL)
+        self._vendor_lock = threading.Lock()
 
     def _get_active_client(self):
         """Get the currently active ERP connection and return the appropriate client."""
@@ -58,16 +68,41 @@ class ERPAdapter:
     def refresh(self):
         """Refresh the active client (call after connection changes)."""
         self.client = self._get_active_client()
+        self.invalidate_vendor_cache()
 
     # ── Vendor Operations ──────────────────────────────────────
 
     def get_vendors(self):
-        """Get vendors from the active ERP backend."""
-        return self.client.get_vendors()
+        """Get vendors from the active ERP backend (cached for VENDOR_CACHE_TTL seconds)."""
+        with self._vendor_lock:
+            vendors = self._vendor_cache.get("all")
+            if vendors is None:
+                vendors = self.client.get_vendors()
+                self._vendor_cache["all"] = vendors
+        return list(vendors)
+
+    def invalidate_vendor_cache(self):
+        """Drop the cached vendor list and lookups (call after vendors are created or edited)."""
+        with self._vendor_lock:
+            self._vendor_cache.clear()
+            self._vendor_by_id.clear()
 
     def get_vendor_by_id(self, vendor_id: int):
-        """Get a single vendor by ID."""
-        return self.client.get_vendor_by_id(vendor_id)
+        """
+        Get a single vendor by ID, plus `name_folded` (lower-cased, stripped).
+        Cached for VENDOR_BY_ID_CACHE_TTL seconds; misses aren't cached.
+        """
+        with self._vendor_lock:
+            vendor = self._vendor_by_id.get(vendor_id)
+        if vendor is None:
+            vendor = self.client.get_vendor_by_id(vendor_id)
+            if vendor is None:
+                return None
+            # Folded once per cache fill for case/whitespace-insensitive name checks
+            vendor = dict(vendor, name_folded=(vendor.get("name") or "").lower().strip())
+            with self._vendor_lock:
+                self._vendor_by_id[vendor_id] = vendor
+        return dict(vendor)
 
     # ── Alias / Learning Operations ────────────────────────────
 
@@ -91,6 +126,10 @@ class ERPAdapter:
         """Get purchase orders from the active ERP backend."""
         return self.client.get_purchase_orders(vendor_id)
 
+    def find_matching_po(self, vendor_id: int, amount: float, tolerance: float = 0.01):
+        """Most recent PO for the vendor whose total matches `amount`, or None."""
+        return self.client.find_matching_po(vendor_id, amount, tolerance)
+
     def get_goods_receipts(self, po_id):
         """Get goods receipts for a PO from the active ERP backend."""
         return self.client.get_goods_receipts(po_id)
@@ -8,12 +8,17 @@ Falls back to console logging if credentials are not configured.
 import logging
 import os
 import sys
+import threading
 import base64
+import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
 from email.mime.text import MIMEText
 
 # Config import
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 from config import settings
+from ..database import AgentSessionLocal
+from .. import crud
 
 logger = logging.getLogger("Notifications")
 
@@ -32,16 +37,52 @@ except ImportError:
     GMAIL_AVAILABLE = False
 
 
-def _get_gmail_service():
-    """Build Gmail API service using OAuth2 credentials from settings."""
+# Sends are slow external HTTP calls — callers that shouldn't wait on them
+# queue them here instead.
+_notify_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="notify")
+
+
+def notify_in_background(send_fn, *args) -> Future:
+    """
+    Run a send_* function on the notification pool and return its Future
+    (result is the send's bool). Exceptions are logged, never raised.
+    """
+    future = _notify_pool.submit(send_fn, *args)
+    future.add_done_callback(_log_send_failure)
+    return future
+
+
+def _log_send_failure(future: Future):
+    error = future.exception()
+    if error is not None:
+        logger.error(f"Background notification failed: {error}")
+
+
+_gmail_local = threading.local()
+
+
+def gmail_service(client_id: str, client_secret: str, refresh_token: str):
+    """
+    Build the Gmail client once per thread and credential set. Sends run on
+    the notification pool and the underlying httplib2 connection isn't
+    thread-safe, so each worker thread keeps its own. The bundled (static)
+    discovery document avoids a network fetch, and the credentials refresh
+    their access token on their own when it expires.
+    """
+    key = (client_id, client_secret, refresh_token)
+    cached = getattr(_gmail_local, "service", None)
+    if cached and cached[0] == key:
+        return cached[1]
     creds = Credentials(
         token=None,
-        refresh_token=settings.GMAIL_REFRESH_TOKEN,
+        refresh_token=refresh_token,
         token_uri="https://oauth2.googleapis.com/token",
-        client_id=settings.GMAIL_CLIENT_ID,
-        client_secret=settings.GMAIL_CLIENT_SECRET,
+        client_id=client_id,
+        client_secret=client_secret
     )
-    return build("gmail", "v1", credentials=creds)
+    service = build('gmail', 'v1', credentials=creds, cache_discovery=False, static_discovery=True)
+    _gmail_local.service = (key, service)
+    return service
 
 
 def send_email_to_supplier(vendor_email: str, item_name: str, quantity: int) -> bool:
@@ -60,7 +101,7 @@ def send_email_to_supplier(vendor_email: str, item_name: str, quantity: int) ->
     # Try real Gmail first
     if GMAIL_AVAILABLE and getattr(settings, "GMAIL_REFRESH_TOKEN", None):
         try:
-            service = _get_gmail_service()
+            service = gmail_service(settings.GMAIL_CLIENT_ID, settings.GMAIL_CLIENT_SECRET, settings.GMAIL_REFRESH_TOKEN)
             message = MIMEText(body)
             message["to"] = vendor_email
             message["subject"] = subject
@@ -128,3 +169,79 @@ def send_whatsapp_to_owner(message: str) -> bool:
     # Fallback: log to console
     logger.info(f"💬 [WHATSAPP LOG] To: {phone} | Message: {message}")
     return False
+
+
+# ── Notification outbox ───────────────────────────────────────────────────────
+OUTBOX_MAX_ATTEMPTS = 3
+OUTBOX_RETRY_DELAY_S = 300
+OUTBOX_LEASE_S = 300  # a SENDING row not settled within this is claimed again
+
+
+def _render_outbox_messages(payload: dict) -> dict:
+    """Per-channel send calls for one outbox row, rendered once."""
+    vendor_email, product, qty = payload["vendor_email"], payload["product"], payload["qty"]
+    sms_msg = f"Procure-IQ: Order placed for {qty}x {product} to {vendor_email}"
+    wa_msg = (
+        f"Procure-IQ Order Confirmed\n\n"
+        f"Item: {product}\n"
+        f"Quantity: {qty} units\n"
+        f"Supplier: {vendor_email}\n"
+        f"Status: Order Sent"
+    )
+    return {
+        "email": lambda: send_email_to_supplier(vendor_email, product, qty),
+        "sms": lambda: send_sms_to_owner(sms_msg),
+        "whatsapp": lambda: send_whatsapp_to_owner(wa_msg),
+    }
+
+
+def _channel_configured(channel: str) -> bool:
+    """False when the channel can only log to console — nothing to retry."""
+    if channel == "email":
+        return GMAIL_AVAILABLE and bool(getattr(settings, "GMAIL_REFRESH_TOKEN", None))
+    return TWILIO_AVAILABLE and bool(getattr(settings, "TWILIO_ACCOUNT_SID", None))
+
+
+def deliver_outbox(outbox_id: int = None) -> int:
+    """
+    Claim due outbox rows (or just `outbox_id`) and send all of each row's
+    channels in this one call. Configured channels that report failure are
+    kept on the row and retried after OUTBOX_RETRY_DELAY_S, up to OUTBOX_MAX_ATTEMPTS.
+    A row that raises (e.g. a bad payload) is settled the same way without
+    holding up the rest of the batch; one left SENDING by a crash is picked
+    up again once its OUTBOX_LEASE_S lease expires.
+    Returns the number of rows handled.
+    """
+    db = AgentSessionLocal()
+    try:
+        rows = crud.claim_outbox(db, outbox_id=outbox_id, lease_s=OUTBOX_LEASE_S)
+        for row in rows:
+            try:
+                sends = _render_outbox_messages(row.payload)
+                failed = []
+                for channel in row.channels:
+                    try:
+                        ok = sends[channel]()
+                    except Exception as e:
+                        logger.error(f"Outbox {row.id} {channel} send failed: {e}")
+                        ok = False
+                    if not ok and _channel_configured(channel):
+                        failed.append(channel)
+                row.channels = failed
+            except Exception as e:
+                logger.error(f"Outbox {row.id} delivery failed: {e}")
+                db.rollback()
+                failed = row.channels or ["*"]
+
+            if not failed:
+                row.status = "SENT"
+            elif row.attempts >= OUTBOX_MAX_ATTEMPTS:
+                row.status = "FAILED"
+                logger.warning(f"Outbox {row.id}: giving up on {failed} after {row.attempts} attempts")
+            else:
+                row.status = "PENDING"
+                row.next_attempt_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=OUTBOX_RETRY_DELAY_S)
+            db.commit()
+        return len(rows)
+    finally:
+        db.close()
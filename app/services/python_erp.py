@@ -8,6 +8,7 @@ enabling real-time visibility across agent, UI, and APIs.
 NO long-lived sessions. NO stale reads.
 """
 
+from sqlalchemy import func
 from ..database import SessionLocal
 from .. import models
 import logging
@@ -51,13 +52,15 @@ class PythonERPClient:
 
     def get_vendor_alias(self, raw_name: str):
         """
-        Look up a vendor alias by raw name.
+        Look up a vendor alias by raw name (case-insensitive).
         Returns {vendor_id, confidence} if found, else None.
         """
+        if not raw_name:
+            return None
         db = SessionLocal()
         try:
             alias = db.query(models.VendorAlias).filter(
-                models.VendorAlias.alias_name == raw_name
+                func.lower(models.VendorAlias.alias_name) == raw_name.lower()
             ).first()
             if alias:
                 logger.info(f"PythonERP: Alias hit: '{raw_name}' → vendor_id={alias.vendor_id} (confidence={alias.confidence})")
@@ -80,7 +83,7 @@ class PythonERPClient:
         db = SessionLocal()
         try:
             existing = db.query(models.VendorAlias).filter(
-                models.VendorAlias.alias_name == alias_name
+                func.lower(models.VendorAlias.alias_name) == alias_name.lower()
             ).first()
             if existing:
                 logger.info(f"PythonERP: Alias '{alias_name}' already exists")
@@ -123,6 +126,33 @@ class PythonERPClient:
         finally:
             db.close()
 
+    def find_matching_po(self, vendor_id: int, amount: float, tolerance: float = 0.01):
+        """
+        Most recent PO for `vendor_id` whose total is within `tolerance` of
+        `amount` — an index probe on (vendor_id, total_amount), not a scan.
+        Returns None if no PO matches.
+        """
+        db = SessionLocal()
+        try:
+            amount = float(amount or 0)
+            p = db.query(models.PurchaseOrder).filter(
+                models.PurchaseOrder.vendor_id == vendor_id,
+                models.PurchaseOrder.total_amount > amount - tolerance,
+                models.PurchaseOrder.total_amount < amount + tolerance,
+            ).order_by(models.PurchaseOrder.created_at.desc()).first()
+            if not p:
+                return None
+            return {
+                "id": p.id,
+                "po_number": p.po_number,
+                "vendor_id": p.vendor_id,
+                "total_amount": p.total_amount,
+                "status": p.status,
+                "quantity": p.quantity,
+            }
+        finally:
+            db.close()
+
     def get_goods_receipts(self, po_id):
         """Get goods receipts for a specific purchase order."""
         db = SessionLocal()
@@ -0,0 +1,46 @@
+// Owner approval form (templates/approval.html). Per-request values come
+// from data attributes so this file can be cached.
+
+function updateCost() {
+    const input = document.getElementById('quantity');
+    const price = parseFloat(input.dataset.unitPrice);
+    const total = (input.value * price).toFixed(2);
+    document.getElementById('total_cost').innerText = '$' + total;
+}
+
+async function submitOrder() {
+    const qty = document.getElementById('quantity').value;
+    const token = document.querySelector('.container').dataset.token;
+
+    if (qty <= 0) { alert("Quantity must be greater than 0"); return; }
+
+    const btn = document.querySelector('.btn-confirm');
+    btn.disabled = true;
+    btn.innerText = "Processing...";
+
+    try {
+        const response = await fetch(`/api/approve/${encodeURIComponent(token)}/confirm`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ quantity: parseInt(qty) })
+        });
+
+        const result = await response.json();
+        if (result.success) {
+            document.body.innerHTML = `<div class='container'><h1>✅ Order Confirmed</h1><p>${result.message}</p><p>PO Number: <strong>${result.po_number}</strong></p></div>`;
+        } else {
+            alert("Error: " + result.detail);
+            btn.disabled = false;
+            btn.innerText = "Confirm Order";
+        }
+    } catch (e) {
+        alert("Network error");
+        btn.disabled = false;
+        btn.innerText = "Confirm Order";
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    document.getElementById('quantity').addEventListener('input', updateCost);
+    document.querySelector('.btn-confirm').addEventListener('click', submitOrder);
+});
@@ -160,7 +160,7 @@ def get_invoice_status(invoice_number: str) -> Dict[str, Any]:
             "confidence_score": invoice.confidence_score,
             "reasoning": invoice.reasoning_note,
             "is_suspicious": invoice.is_suspicious,
-            "audit_trail": invoice.audit_trail,
+            "audit_trail": invoice.audit_log,
             "created_at": invoice.invoice_date.isoformat() if invoice.invoice_date else None
         }
     
@@ -226,16 +226,12 @@ def approve_invoice(invoice_number: str, reason: Optional[str] = None) -> Dict[s
         invoice.status = "APPROVED"
         
         # Add audit trail
-        from sqlalchemy.orm.attributes import flag_modified
         from datetime import datetime
         
-        invoice.audit_trail.append({
-            "t": "manual_approval",
-            "m": reason or "Manually approved via tool",
-            "old_status": old_status,
-            "timestamp": datetime.now().isoformat()
-        })
-        flag_modified(invoice, "audit_trail")
+        invoice.add_audit(
+            db, "manual_approval", reason or "Manually approved via tool",
+            old_status=old_status, timestamp=datetime.now().isoformat(),
+        )
         
         db.commit()
         